@@ -2,38 +2,113 @@
 Main Application File
 Ứng dụng Flask chính với các route và cấu hình
 """
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import (Flask, render_template, request, redirect, url_for, session, flash, jsonify, g, abort,
+                   send_from_directory, make_response)
 from functools import wraps
 import os
+import time
 from datetime import timedelta
 
-from database import Database
-from auth import AuthService
-from email_service import EmailService
-from utils import generate_otp, verify_otp_code
+from assets import AssetManifest, IMMUTABLE_CACHE_CONTROL
+from hashing import HashingBusyError, HashingTimeoutError
+from metrics import metrics, CONTENT_TYPE, HTTP_REQUEST_SECONDS, HTTP_REQUESTS
+from page_cache import page_version, PAGE_CACHE_CONTROL
+import routes
+from services import db, page_cache, start_background_services
+from session_store import ServerSessionInterface
+from templating import configure_templates, page_templates
+from utils import otp_input_pattern, OTP_LENGTH, OTP_ALPHABET
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24)
+app.secret_key = os.getenv('SECRET_KEY') or os.urandom(24)
+# Session lưu trong database, cookie chỉ chứa session id nên mọi worker dùng chung
+app.session_interface = ServerSessionInterface(db)
 app.config['SESSION_COOKIE_SECURE'] = True
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
 
-# Khởi tạo services
-db = Database()
-auth_service = AuthService(db)
-email_service = EmailService()
+# Static đã minify, hash tên file và nén sẵn; url_for('static', ...) trả về tên đã hash
+assets = AssetManifest(app.static_folder)
+app.url_defaults(assets.url_defaults)
+
+# Biên dịch template ngay khi khởi động, bytecode lưu trên đĩa dùng chung giữa các worker
+configure_templates(app)
+# ETag trang đổi theo bản deploy (template, static) ngoài dữ liệu user
+page_cache.version = page_version(assets.manifest, app.jinja_env, page_templates(app.jinja_env))
 
 def login_required(f):
     """Decorator để bảo vệ các route cần đăng nhập"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
-            flash('Vui lòng đăng nhập để tiếp tục', 'warning')
+            flash(routes.LOGIN_REQUIRED_MESSAGE, 'warning')
             return redirect(url_for('login'))
         return f(*args, **kwargs)
     return decorated_function
 
+def load_user(user_id):
+    """Lấy user qua cache, dùng lại trong cùng một request"""
+    users = g.setdefault('users', {})
+    if user_id not in users:
+        users[user_id] = db.get_user_by_id(user_id)
+    return users[user_id]
+
+def client():
+    """(ip, user agent) của request cho rate limit và lịch sử đăng nhập"""
+    return request.remote_addr, request.headers.get('User-Agent', '')
+
+def respond(outcome):
+    """Dựng response từ kết quả của routes: flash, rồi redirect, JSON hoặc render template"""
+    if outcome.get('message'):
+        flash(outcome['message'], outcome['category'])
+    if 'redirect' in outcome:
+        return redirect(url_for(outcome['redirect']))
+    if 'json' in outcome:
+        return jsonify(outcome['json']), outcome['status'], outcome['headers']
+    return render_template(outcome['template'], **outcome['context']), outcome['status']
+
+def render_user_page(page, user):
+    """Render trang theo user với ETag yếu: If-None-Match khớp thì trả 304 không render,
+    HTML đã render được dùng lại cho đến khi user thay đổi"""
+    if session.get('_flashes'):
+        # Thông báo flash chỉ hiện một lần nên trang có flash không được cache
+        response = make_response(render_template(f'{page}.html', user=user))
+    else:
+        etag = page_cache.etag(page, user)
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            html = page_cache.get(user['id'], page, etag)
+            if html is None:
+                html = render_template(f'{page}.html', user=user)
+                page_cache.put(user['id'], page, etag, html)
+            response = make_response(html)
+        response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = PAGE_CACHE_CONTROL
+    response.vary.add('Cookie')
+    return response
+
+@app.context_processor
+def inject_otp_format():
+    """Độ dài và pattern OTP cho ô nhập mã"""
+    return {'otp_length': OTP_LENGTH, 'otp_pattern': otp_input_pattern(),
+            'otp_numeric': OTP_ALPHABET.isdigit()}
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Đo thời gian xử lý theo route (dùng rule thay cho URL để giới hạn số nhãn)"""
+    if metrics.enabled and 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                     route=route, method=request.method)
+        HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    return response
+
 @app.route('/')
 def index():
     """Trang chủ"""
@@ -45,192 +120,88 @@ def index():
 def register():
     """Đăng ký tài khoản mới"""
     if request.method == 'POST':
-        username = request.form.get('username')
-        email = request.form.get('email')
-        password = request.form.get('password')
-        confirm_password = request.form.get('confirm_password')
-        phone = request.form.get('phone', '')
-        
-        # Validation
-        if not all([username, email, password, confirm_password]):
-            flash('Vui lòng điền đầy đủ thông tin', 'error')
-            return render_template('register.html')
-        
-        if password != confirm_password:
-            flash('Mật khẩu xác nhận không khớp', 'error')
-            return render_template('register.html')
-        
-        if len(password) < 8:
-            flash('Mật khẩu phải có ít nhất 8 ký tự', 'error')
-            return render_template('register.html')
-        
-        # Đăng ký user
-        result = auth_service.register_user(username, email, password, phone)
-        
-        if result['success']:
-            flash('Đăng ký thành công! Vui lòng đăng nhập', 'success')
-            return redirect(url_for('login'))
-        else:
-            flash(result['message'], 'error')
-            return render_template('register.html')
-    
+        return respond(routes.register(request.form))
     return render_template('register.html')
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """Đăng nhập - Bước 1: Xác thực mật khẩu"""
     if request.method == 'POST':
-        email = request.form.get('email')
-        password = request.form.get('password')
-        
-        if not all([email, password]):
-            flash('Vui lòng điền đầy đủ thông tin', 'error')
-            return render_template('login.html')
-        
-        # Xác thực mật khẩu
-        result = auth_service.authenticate_user(email, password)
-        
-        if result['success']:
-            user = result['user']
-            
-            # Tạo OTP và gửi email
-            otp_code = generate_otp()
-            auth_service.save_otp(user['id'], otp_code)
-            
-            # Gửi OTP qua email
-            email_sent = email_service.send_otp_email(user['email'], user['username'], otp_code)
-            
-            if email_sent:
-                # Lưu thông tin tạm vào session
-                session['temp_user_id'] = user['id']
-                session['temp_email'] = user['email']
-                flash('OTP đã được gửi đến email của bạn', 'info')
-                return redirect(url_for('verify_otp'))
-            else:
-                flash('Không thể gửi OTP. Vui lòng thử lại', 'error')
-        else:
-            flash(result['message'], 'error')
-    
+        return respond(routes.login(request.form, session, client()))
     return render_template('login.html')
 
 @app.route('/verify-otp', methods=['GET', 'POST'])
 def verify_otp():
     """Đăng nhập - Bước 2: Xác thực OTP"""
-    if 'temp_user_id' not in session:
-        flash('Phiên làm việc hết hạn. Vui lòng đăng nhập lại', 'warning')
-        return redirect(url_for('login'))
-    
-    if request.method == 'POST':
-        otp_code = request.form.get('otp')
-        user_id = session.get('temp_user_id')
-        
-        if not otp_code:
-            flash('Vui lòng nhập mã OTP', 'error')
-            return render_template('verify_otp.html')
-        
-        # Xác thực OTP
-        if auth_service.verify_otp(user_id, otp_code):
-            # Đăng nhập thành công
-            user = db.get_user_by_id(user_id)
-            session.permanent = True
-            session['user_id'] = user['id']
-            session['username'] = user['username']
-            session['email'] = user['email']
-            
-            # Xóa thông tin tạm
-            session.pop('temp_user_id', None)
-            session.pop('temp_email', None)
-            
-            # Cập nhật last login
-            auth_service.update_last_login(user_id)
-            
-            flash(f'Chào mừng {user["username"]}!', 'success')
-            return redirect(url_for('dashboard'))
-        else:
-            flash('Mã OTP không đúng hoặc đã hết hạn', 'error')
-    
-    return render_template('verify_otp.html', email=session.get('temp_email'))
+    form = request.form if request.method == 'POST' else None
+    return respond(routes.verify_otp(form, session, client()))
 
 @app.route('/resend-otp', methods=['POST'])
 def resend_otp():
     """Gửi lại mã OTP"""
-    if 'temp_user_id' not in session:
-        return jsonify({'success': False, 'message': 'Phiên làm việc hết hạn'})
-    
-    user_id = session.get('temp_user_id')
-    user = db.get_user_by_id(user_id)
-    
-    # Tạo OTP mới
-    otp_code = generate_otp()
-    auth_service.save_otp(user_id, otp_code)
-    
-    # Gửi email
-    email_sent = email_service.send_otp_email(user['email'], user['username'], otp_code)
-    
-    if email_sent:
-        return jsonify({'success': True, 'message': 'OTP mới đã được gửi'})
-    else:
-        return jsonify({'success': False, 'message': 'Không thể gửi OTP'})
+    return respond(routes.resend_otp(session, client()))
 
 @app.route('/dashboard')
 @login_required
 def dashboard():
     """Trang dashboard sau khi đăng nhập"""
-    user = db.get_user_by_id(session['user_id'])
-    return render_template('dashboard.html', user=user)
+    user = load_user(session['user_id'])
+    return render_user_page('dashboard', user)
 
 @app.route('/profile')
 @login_required
 def profile():
     """Trang thông tin cá nhân"""
-    user = db.get_user_by_id(session['user_id'])
-    return render_template('profile.html', user=user)
+    user = load_user(session['user_id'])
+    return render_user_page('profile', user)
 
 @app.route('/security')
 @login_required
 def security():
     """Trang cài đặt bảo mật"""
-    user = db.get_user_by_id(session['user_id'])
-    return render_template('security.html', user=user)
+    user = load_user(session['user_id'])
+    return render_user_page('security', user)
 
 @app.route('/change-password', methods=['POST'])
 @login_required
 def change_password():
     """Đổi mật khẩu"""
-    current_password = request.form.get('current_password')
-    new_password = request.form.get('new_password')
-    confirm_password = request.form.get('confirm_password')
-    
-    if not all([current_password, new_password, confirm_password]):
-        flash('Vui lòng điền đầy đủ thông tin', 'error')
-        return redirect(url_for('security'))
-    
-    if new_password != confirm_password:
-        flash('Mật khẩu mới không khớp', 'error')
-        return redirect(url_for('security'))
-    
-    if len(new_password) < 8:
-        flash('Mật khẩu mới phải có ít nhất 8 ký tự', 'error')
-        return redirect(url_for('security'))
-    
-    # Đổi mật khẩu
-    result = auth_service.change_password(session['user_id'], current_password, new_password)
-    
-    if result['success']:
-        flash('Đổi mật khẩu thành công', 'success')
-    else:
-        flash(result['message'], 'error')
-    
-    return redirect(url_for('security'))
+    return respond(routes.change_password(request.form, session))
 
 @app.route('/logout')
 @login_required
 def logout():
     """Đăng xuất"""
-    username = session.get('username', 'User')
-    session.clear()
-    flash(f'Tạm biệt {username}!', 'info')
-    return redirect(url_for('index'))
+    return respond(routes.logout(session))
+
+@app.route('/static/dist/<path:filename>')
+def hashed_static(filename):
+    """File static đã hash: cache vĩnh viễn, gửi bản nén sẵn theo Accept-Encoding"""
+    selected = assets.select(filename, request.accept_encodings)
+    if selected is None:
+        abort(404)
+    path, encoding, mimetype = selected
+    response = send_from_directory(assets.dist_dir, path, mimetype=mimetype)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Metrics dạng Prometheus của process hiện tại"""
+    if not metrics.enabled:
+        abort(404)
+    return metrics.render(), 200, {'Content-Type': CONTENT_TYPE}
+
+@app.route('/admin/api/users')
+def admin_users():
+    """API cho bộ phận hỗ trợ: tìm kiếm (?q=) và liệt kê user, phân trang bằng cursor"""
+    outcome = routes.admin_users(request.headers.get('Authorization'), request.args)
+    if outcome is None:
+        abort(404)
+    return respond(outcome)
 
 @app.errorhandler(404)
 def not_found(e):
@@ -240,11 +211,17 @@ def not_found(e):
 def server_error(e):
     return render_template('500.html'), 500
 
+@app.errorhandler(HashingBusyError)
+@app.errorhandler(HashingTimeoutError)
+def server_busy(e):
+    """Từ chối nhanh khi hàng đợi băm mật khẩu quá tải"""
+    return render_template('503.html'), 503, {'Retry-After': '1'}
+
 if __name__ == '__main__':
-    # Khởi tạo database
-    db.init_db()
+    # Khởi tạo database và các job nền
+    start_background_services()
     
-    # Chạy app
+    # Chạy app (chế độ dev; production dùng serve.py)
     print("🚀 Server đang chạy tại http://localhost:5000")
     print("📧 Cấu hình email trong email_service.py để gửi OTP")
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,289 @@
+"""
+ASGI Application
+Bản async (Quart) của app.py với cùng các route; logic route dùng chung trong routes.py,
+ở đây chỉ chạy qua executor (database, bcrypt, gửi email) nên event loop không bị chặn
+Chạy production: python serve.py
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial, wraps
+
+from quart import (Quart, render_template, request, redirect, url_for, session, flash, jsonify, g, abort,
+                   send_from_directory, make_response)
+from quart.sessions import SessionInterface
+
+from assets import AssetManifest, IMMUTABLE_CACHE_CONTROL
+from hashing import HashingBusyError, HashingTimeoutError
+from metrics import metrics, CONTENT_TYPE, HTTP_REQUEST_SECONDS, HTTP_REQUESTS
+from page_cache import page_version, PAGE_CACHE_CONTROL
+import routes
+from services import db, page_cache, start_background_services, stop_background_services
+from session_store import ServerSessionInterface
+from templating import configure_templates, page_templates
+from utils import otp_input_pattern, OTP_LENGTH, OTP_ALPHABET
+
+app = Quart(__name__)
+app.secret_key = os.getenv('SECRET_KEY') or os.urandom(24)
+app.config['SESSION_COOKIE_SECURE'] = True
+app.config['SESSION_COOKIE_HTTPONLY'] = True
+app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
+
+# Static đã minify, hash tên file và nén sẵn; url_for('static', ...) trả về tên đã hash
+assets = AssetManifest(app.static_folder)
+app.url_defaults(assets.url_defaults)
+
+# Biên dịch template ngay khi khởi động, bytecode lưu trên đĩa dùng chung giữa các worker
+configure_templates(app)
+# ETag trang đổi theo bản deploy (template, static) ngoài dữ liệu user
+page_cache.version = page_version(assets.manifest, app.jinja_env, page_templates(app.jinja_env))
+
+# Thread cho các lời gọi chặn (SQLite, chờ process pool bcrypt)
+_io_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('ASYNC_IO_THREADS', '32')), thread_name_prefix='asgi-io'
+)
+
+
+async def blocking(fn, *args, **kwargs):
+    """Chạy hàm chặn trong thread pool và chờ kết quả"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, partial(fn, *args, **kwargs))
+
+
+class AsyncSessionInterface(SessionInterface):
+    """Bọc ServerSessionInterface để đọc/ghi session qua executor"""
+    def __init__(self, interface):
+        self.interface = interface
+    
+    async def open_session(self, app, request):
+        return await blocking(self.interface.open_session, app, request)
+    
+    async def save_session(self, app, session, response):
+        await blocking(self.interface.save_session, app, session, response)
+
+
+# Session lưu trong database, cookie chỉ chứa session id nên mọi worker dùng chung
+app.session_interface = AsyncSessionInterface(ServerSessionInterface(db))
+
+
+@app.before_serving
+async def startup():
+    await blocking(start_background_services)
+
+
+@app.after_serving
+async def shutdown():
+    await blocking(stop_background_services)
+    _io_executor.shutdown(wait=False)
+
+
+def login_required(f):
+    """Decorator để bảo vệ các route cần đăng nhập"""
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            await flash(routes.LOGIN_REQUIRED_MESSAGE, 'warning')
+            return redirect(url_for('login'))
+        return await f(*args, **kwargs)
+    return decorated_function
+
+
+async def load_user(user_id):
+    """Lấy user qua cache, dùng lại trong cùng một request"""
+    users = g.setdefault('users', {})
+    if user_id not in users:
+        users[user_id] = await blocking(db.get_user_by_id, user_id)
+    return users[user_id]
+
+
+def client():
+    """(ip, user agent) của request cho rate limit và lịch sử đăng nhập"""
+    return request.remote_addr, request.headers.get('User-Agent', '')
+
+
+def current_session():
+    """Đối tượng session thật: proxy `session` không dùng được trong thread của executor"""
+    return session._get_current_object()
+
+
+async def respond(outcome):
+    """Dựng response từ kết quả của routes: flash, rồi redirect, JSON hoặc render template"""
+    if outcome.get('message'):
+        await flash(outcome['message'], outcome['category'])
+    if 'redirect' in outcome:
+        return redirect(url_for(outcome['redirect']))
+    if 'json' in outcome:
+        return jsonify(outcome['json']), outcome['status'], outcome['headers']
+    return await render_template(outcome['template'], **outcome['context']), outcome['status']
+
+
+async def render_user_page(page, user):
+    """Render trang theo user với ETag yếu: If-None-Match khớp thì trả 304 không render,
+    HTML đã render được dùng lại cho đến khi user thay đổi"""
+    if session.get('_flashes'):
+        # Thông báo flash chỉ hiện một lần nên trang có flash không được cache
+        response = await make_response(await render_template(f'{page}.html', user=user))
+    else:
+        etag = page_cache.etag(page, user)
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class('', status=304)
+        else:
+            html = page_cache.get(user['id'], page, etag)
+            if html is None:
+                html = await render_template(f'{page}.html', user=user)
+                page_cache.put(user['id'], page, etag, html)
+            response = await make_response(html)
+        response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = PAGE_CACHE_CONTROL
+    response.vary.add('Cookie')
+    return response
+
+
+@app.context_processor
+async def inject_otp_format():
+    """Độ dài và pattern OTP cho ô nhập mã"""
+    return {'otp_length': OTP_LENGTH, 'otp_pattern': otp_input_pattern(),
+            'otp_numeric': OTP_ALPHABET.isdigit()}
+
+
+@app.before_request
+async def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+async def record_request_metrics(response):
+    """Đo thời gian xử lý theo route (dùng rule thay cho URL để giới hạn số nhãn)"""
+    if metrics.enabled and 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                     route=route, method=request.method)
+        HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    return response
+
+
+@app.route('/')
+async def index():
+    """Trang chủ"""
+    if 'user_id' in session:
+        return redirect(url_for('dashboard'))
+    return await render_template('index.html')
+
+
+@app.route('/register', methods=['GET', 'POST'])
+async def register():
+    """Đăng ký tài khoản mới"""
+    if request.method == 'POST':
+        return await respond(await blocking(routes.register, await request.form))
+    return await render_template('register.html')
+
+
+@app.route('/login', methods=['GET', 'POST'])
+async def login():
+    """Đăng nhập - Bước 1: Xác thực mật khẩu"""
+    if request.method == 'POST':
+        return await respond(await blocking(routes.login, await request.form, current_session(), client()))
+    return await render_template('login.html')
+
+
+@app.route('/verify-otp', methods=['GET', 'POST'])
+async def verify_otp():
+    """Đăng nhập - Bước 2: Xác thực OTP"""
+    form = await request.form if request.method == 'POST' else None
+    return await respond(await blocking(routes.verify_otp, form, current_session(), client()))
+
+
+@app.route('/resend-otp', methods=['POST'])
+async def resend_otp():
+    """Gửi lại mã OTP"""
+    return await respond(await blocking(routes.resend_otp, current_session(), client()))
+
+
+@app.route('/dashboard')
+@login_required
+async def dashboard():
+    """Trang dashboard sau khi đăng nhập"""
+    user = await load_user(session['user_id'])
+    return await render_user_page('dashboard', user)
+
+
+@app.route('/profile')
+@login_required
+async def profile():
+    """Trang thông tin cá nhân"""
+    user = await load_user(session['user_id'])
+    return await render_user_page('profile', user)
+
+
+@app.route('/security')
+@login_required
+async def security():
+    """Trang cài đặt bảo mật"""
+    user = await load_user(session['user_id'])
+    return await render_user_page('security', user)
+
+
+@app.route('/change-password', methods=['POST'])
+@login_required
+async def change_password():
+    """Đổi mật khẩu"""
+    return await respond(await blocking(routes.change_password, await request.form, current_session()))
+
+
+@app.route('/logout')
+@login_required
+async def logout():
+    """Đăng xuất"""
+    return await respond(routes.logout(session))
+
+
+@app.route('/static/dist/<path:filename>')
+async def hashed_static(filename):
+    """File static đã hash: cache vĩnh viễn, gửi bản nén sẵn theo Accept-Encoding"""
+    selected = assets.select(filename, request.accept_encodings)
+    if selected is None:
+        abort(404)
+    path, encoding, mimetype = selected
+    response = await send_from_directory(assets.dist_dir, path, mimetype=mimetype)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@app.route('/metrics')
+async def metrics_endpoint():
+    """Metrics dạng Prometheus của process hiện tại"""
+    if not metrics.enabled:
+        abort(404)
+    return await blocking(metrics.render), 200, {'Content-Type': CONTENT_TYPE}
+
+
+@app.route('/admin/api/users')
+async def admin_users():
+    """API cho bộ phận hỗ trợ: tìm kiếm (?q=) và liệt kê user, phân trang bằng cursor"""
+    outcome = await blocking(routes.admin_users, request.headers.get('Authorization'), request.args)
+    if outcome is None:
+        abort(404)
+    return await respond(outcome)
+
+
+@app.errorhandler(404)
+async def not_found(e):
+    return await render_template('404.html'), 404
+
+
+@app.errorhandler(500)
+async def server_error(e):
+    return await render_template('500.html'), 500
+
+
+@app.errorhandler(HashingBusyError)
+@app.errorhandler(HashingTimeoutError)
+async def server_busy(e):
+    """Từ chối nhanh khi hàng đợi băm mật khẩu quá tải"""
+    return await render_template('503.html'), 503, {'Retry-After': '1'}
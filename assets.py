@@ -0,0 +1,248 @@
+"""
+Static Assets
+Build CSS/JS: minify, ghi bản có hash nội dung trong tên file kèm bản nén
+gzip (và brotli nếu đã cài), phục vụ với Cache-Control immutable.
+url_for('static', ...) tự trả về tên đã hash qua manifest.
+
+Chạy: python assets.py  (build trước khi deploy; app cũng tự build khi khởi động)
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# (encoding, đuôi file) theo thứ tự ưu tiên khi client hỗ trợ nhiều loại
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_STRING = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+
+
+def minify_css(text):
+    """Bỏ comment và khoảng trắng thừa, giữ nguyên nội dung chuỗi"""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    parts = []
+    last = 0
+    for match in _STRING.finditer(text):
+        parts.append(_minify_css_code(text[last:match.start()]))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(_minify_css_code(text[last:]))
+    return ''.join(parts).strip()
+
+
+def _minify_css_code(code):
+    code = re.sub(r'\s+', ' ', code)
+    code = re.sub(r'\s*([{};,>])\s*', r'\1', code)
+    code = re.sub(r':\s+', ':', code)
+    # Khoảng trắng trước ':' trong selector có nghĩa ("a :hover" khác "a:hover"): chỉ bỏ
+    # trong khai báo, tức khi ký tự kết thúc tiếp theo là ';' hoặc '}' chứ không phải '{'
+    code = re.sub(r'\s+:(?=[^{};]*[;}])', ':', code)
+    return code.replace(';}', '}')
+
+
+# Sau các ký tự/từ khóa này, '/' mở đầu regex literal chứ không phải phép chia
+_REGEX_PREFIX = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void',
+                   'throw', 'yield', 'await'}
+
+
+def _regex_allowed(text, last):
+    """'/' sau ký tự ở vị trí last (-1 = đầu file) là regex literal"""
+    if last < 0 or text[last] in _REGEX_PREFIX:
+        return True
+    word = re.search(r'[\w$]+$', text[max(0, last - 8):last + 1])
+    return word is not None and word.group(0) in _REGEX_KEYWORDS
+
+
+def _js_code_lines(text):
+    """Với mỗi dòng: True nếu dòng bắt đầu ở code thường (không nằm trong chuỗi,
+    template literal, comment /* */ hay regex), chỉ những dòng này được sửa"""
+    result = [True]
+    state = 'code'
+    # Mỗi ${ trong template literal: số { đang mở bên trong biểu thức
+    templates = []
+    # Vị trí ký tự khác khoảng trắng cuối cùng trong code
+    last = -1
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == '\n':
+            if state in ('line', "'", '"', 'regex', 'class'):
+                # Chuỗi '/" và regex không kéo dài qua dòng (trừ khi có \ ở cuối, đã bỏ qua ở dưới)
+                state = 'code'
+            result.append(state == 'code')
+        elif state == 'code':
+            if c in '\'"`':
+                state = c
+            elif c == '/' and text.startswith('//', i):
+                state = 'line'
+            elif c == '/' and text.startswith('/*', i):
+                state = 'block'
+                i += 1
+            elif c == '/' and _regex_allowed(text, last):
+                state = 'regex'
+            elif c == '{' and templates:
+                templates[-1] += 1
+            elif c == '}' and templates:
+                if templates[-1]:
+                    templates[-1] -= 1
+                else:
+                    templates.pop()
+                    state = '`'
+            if state == 'code' and not c.isspace():
+                last = i
+        elif state in ("'", '"', '`', 'regex', 'class'):
+            if c == '\\':
+                if text.startswith('\n', i + 1):
+                    result.append(False)
+                i += 1
+            elif state == '`' and text.startswith('${', i):
+                templates.append(0)
+                state = 'code'
+                last = i + 1
+                i += 1
+            elif state == 'regex' and c == '[':
+                state = 'class'
+            elif state == 'class' and c == ']':
+                state = 'regex'
+            elif c == state or (state == 'regex' and c == '/'):
+                state = 'code'
+                last = i
+        elif state == 'block' and text.startswith('*/', i):
+            state = 'code'
+            i += 1
+        i += 1
+    return result
+
+
+def minify_js(text):
+    """Minify an toàn: bỏ thụt lề, dòng trống và dòng chỉ có comment //.
+    Giữ xuống dòng (code dựa vào tự chèn dấu chấm phẩy); dòng nằm trong chuỗi,
+    template literal hay comment nhiều dòng được giữ nguyên"""
+    lines = []
+    for line, code in zip(text.split('\n'), _js_code_lines(text)):
+        if not code:
+            lines.append(line)
+            continue
+        stripped = line.strip()
+        if stripped and not stripped.startswith('//'):
+            lines.append(stripped)
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _write(path, data):
+    """Ghi qua file tạm rồi đổi tên để worker khác không đọc phải file dở"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build_assets(static_dir=STATIC_DIR):
+    """Build toàn bộ CSS/JS trong static/, trả về manifest {tên gốc: tên đã hash}"""
+    dist = os.path.join(static_dir, DIST_DIR)
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(dist):
+            dirs[:] = []
+            continue
+        for name in sorted(files):
+            ext = os.path.splitext(name)[1]
+            if ext not in MINIFIERS:
+                continue
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            with open(source, encoding='utf-8') as f:
+                data = MINIFIERS[ext](f.read()).encode('utf-8')
+
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            hashed = f'{os.path.splitext(logical)[0]}.{digest}{ext}'
+            target = os.path.join(dist, hashed)
+            if not os.path.exists(target):
+                # Nén sẵn một lần, mtime=0 để build lại cho ra cùng nội dung
+                _write(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _write(target + '.br', brotli.compress(data, quality=11))
+                _write(target, data)
+            manifest[logical] = f'{DIST_DIR}/{hashed}'
+
+    _write(os.path.join(dist, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+class AssetManifest:
+    def __init__(self, static_dir=STATIC_DIR, build=None):
+        self.static_dir = static_dir
+        self.dist_dir = os.path.join(static_dir, DIST_DIR)
+        build = build if build is not None else os.getenv('ASSETS_BUILD', '1') == '1'
+        self.manifest = self._build() if build else self._load()
+        # Các bản nén có sẵn của từng file đã hash, tra một lần thay vì stat mỗi request
+        self.variants = {}
+        for path in self.manifest.values():
+            filename = path[len(DIST_DIR) + 1:]
+            self.variants[filename] = [
+                (encoding, suffix) for encoding, suffix in ENCODINGS
+                if os.path.exists(os.path.join(self.dist_dir, filename + suffix))
+            ]
+
+    def _build(self):
+        try:
+            return build_assets(self.static_dir)
+        except OSError as e:
+            # Thư mục static chỉ đọc: dùng bản đã build sẵn (python assets.py) nếu có
+            print(f"⚠️  Không build được static assets: {str(e)}")
+            return self._load()
+
+    def _load(self):
+        """Đọc manifest đã build sẵn; không có thì dùng file gốc"""
+        try:
+            with open(os.path.join(self.dist_dir, MANIFEST_NAME), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def url_defaults(self, endpoint, values):
+        """Hook url_defaults: url_for('static', filename=...) trả về bản đã hash"""
+        if endpoint == 'static':
+            filename = values.get('filename')
+            if filename in self.manifest:
+                values['filename'] = self.manifest[filename]
+
+    def select(self, filename, accept_encodings):
+        """Chọn file phục vụ cho request: (tên file trong dist, encoding hoặc None, mimetype)
+        accept_encodings: request.accept_encodings. None nếu không phải file đã hash"""
+        variants = self.variants.get(filename)
+        if variants is None:
+            return None
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, suffix in variants:
+            if accept_encodings.quality(encoding) > 0:
+                return filename + suffix, encoding, mimetype
+        return filename, None, mimetype
+
+
+if __name__ == '__main__':
+    for logical, hashed in build_assets().items():
+        path = os.path.join(STATIC_DIR, hashed)
+        sizes = [f'{os.path.getsize(path)} B']
+        for encoding, suffix in ENCODINGS:
+            if os.path.exists(path + suffix):
+                sizes.append(f'{encoding} {os.path.getsize(path + suffix)} B')
+        print(f"✅ {logical} -> {hashed} ({', '.join(sizes)})")
@@ -0,0 +1,100 @@
+"""
+Login Audit
+Ghi lịch sử đăng nhập và last_login qua ring buffer trong bộ nhớ,
+thread nền ghi xuống database theo lô (đủ số lượng hoặc hết thời gian)
+"""
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+
+class LoginAuditWriter:
+    def __init__(self, database, capacity=None, batch_size=None, flush_interval=None):
+        self.db = database
+        self.capacity = capacity or int(os.getenv('AUDIT_BUFFER_SIZE', '10000'))
+        self.batch_size = batch_size or int(os.getenv('AUDIT_BATCH_SIZE', '200'))
+        self.flush_interval = flush_interval or float(os.getenv('AUDIT_FLUSH_INTERVAL', '1'))
+        # Ring buffer: khi đầy, bản ghi cũ nhất bị bỏ thay vì chặn request
+        self._buffer = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {'recorded': 0, 'dropped': 0, 'written': 0, 'flushes': 0}
+    
+    def record(self, user_id, ip_address, user_agent, status, email=None):
+        """Ghi nhận một lần đăng nhập; status 'success' đồng thời cập nhật last_login.
+        user_id None: email không tồn tại, chỉ lưu email đã thử"""
+        login_time = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            if len(self._buffer) == self.capacity:
+                self._stats['dropped'] += 1
+            self._buffer.append((user_id, email, ip_address, user_agent, status, login_time))
+            self._stats['recorded'] += 1
+            full = len(self._buffer) >= self.batch_size
+        if full or self._thread is None:
+            self._wakeup.set()
+        if self._thread is None:
+            # Không có thread nền (dev/test): ghi ngay
+            self.flush()
+    
+    def flush(self):
+        """Ghi toàn bộ buffer xuống database, trả về số bản ghi đã ghi"""
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._buffer)
+                self._buffer.clear()
+            if not rows:
+                return 0
+            
+            # Mỗi user chỉ cần last_login mới nhất trong lô
+            last_logins = {}
+            for user_id, _, _, _, status, login_time in rows:
+                if status == 'success' and user_id is not None:
+                    last_logins[user_id] = login_time
+            try:
+                self.db.write_login_audit(rows, list(last_logins.items()))
+            except Exception as e:
+                print(f"❌ Lỗi ghi lịch sử đăng nhập: {str(e)}")
+                # Trả lại buffer để lần sau thử lại (bản ghi mới vẫn được ưu tiên giữ)
+                with self._lock:
+                    room = self.capacity - len(self._buffer)
+                    if room > 0:
+                        self._buffer.extendleft(reversed(rows[-room:]))
+                return 0
+            with self._lock:
+                self._stats['written'] += len(rows)
+                self._stats['flushes'] += 1
+            return len(rows)
+    
+    def _loop(self):
+        """Vòng lặp thread nền: ghi khi đủ lô hoặc hết flush_interval"""
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+        self.flush()
+    
+    def start(self):
+        """Khởi động thread ghi nền"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='login-audit', daemon=True)
+            self._thread.start()
+    
+    def stop(self, timeout=None):
+        """Dừng thread nền và ghi nốt phần còn lại trong buffer"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+    
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['buffered'] = len(self._buffer)
+        return stats
@@ -2,21 +2,37 @@
 Authentication Service
 Xử lý logic xác thực, băm mật khẩu, OTP
 """
-import hashlib
-import bcrypt
-from datetime import datetime, timedelta
-from utils import hash_password_md5, hash_password_sha256, verify_password
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import hash_password_md5, hash_password_sha256, get_bcrypt_cost
+from hashing import HashingExecutor, HashingBusyError, HashingTimeoutError
+from otp_store import create_otp_store
+from metrics import AUTH_STAGE_SECONDS, AUTH_ATTEMPTS, OTP_FAILURES
+
+HASH_PROFILES = ('demo', 'production')
 
 class AuthService:
-    def __init__(self, database):
+    def __init__(self, database, hasher=None, hash_profile=None, otp_store=None):
         self.db = database
+        self.otp_store = otp_store or create_otp_store(database)
+        # demo: lưu cả MD5/SHA-256 để hiển thị; production: chỉ lưu bcrypt
+        self.hash_profile = hash_profile or os.getenv('HASH_PROFILE', 'demo')
+        if self.hash_profile not in HASH_PROFILES:
+            raise ValueError(f'HASH_PROFILE không hợp lệ: {self.hash_profile}')
+        # Bcrypt chạy qua executor; mặc định băm ngay trên thread gọi
+        self.hasher = hasher or HashingExecutor(workers=0)
+        # Băm lại mật khẩu cũ chạy nền sau khi đăng nhập, không cộng vào độ trễ login
+        self._rehash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rehash')
+        self._rehash_pending = set()
+        self._rehash_lock = threading.Lock()
     
     def register_user(self, username, email, password, phone=''):
         """Đăng ký user mới với mật khẩu băm"""
-        # Băm mật khẩu với nhiều thuật toán
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        password_md5 = hash_password_md5(password)
-        password_sha256 = hash_password_sha256(password)
+        # Băm mật khẩu (thêm MD5/SHA-256 nếu đang ở profile demo)
+        with AUTH_STAGE_SECONDS.time(stage='bcrypt_hash'):
+            password_hash = self.hasher.hash_password(password)
+        password_md5, password_sha256 = self._demo_hashes(password)
         
         # Tạo user trong database
         result = self.db.create_user(
@@ -32,35 +48,67 @@ class AuthService:
     
     def authenticate_user(self, email, password):
         """Xác thực user với email và mật khẩu"""
-        user = self.db.get_user_by_email(email)
+        # Luôn đọc từ database: cache có thể giữ hash cũ đã bị worker khác đổi
+        user = self.db.get_user_by_email(email, use_cache=False)
         
         if not user:
-            return {'success': False, 'message': 'Email không tồn tại'}
+            AUTH_ATTEMPTS.inc(outcome='unknown_email')
+            return {'success': False, 'message': 'Email không tồn tại', 'status': 'unknown_email'}
         
         if not user['is_active']:
-            return {'success': False, 'message': 'Tài khoản đã bị khóa'}
+            AUTH_ATTEMPTS.inc(outcome='inactive')
+            return {'success': False, 'message': 'Tài khoản đã bị khóa',
+                    'user_id': user['id'], 'status': 'inactive'}
         
         # Verify password với bcrypt
-        if verify_password(password, user['password_hash']):
+        with AUTH_STAGE_SECONDS.time(stage='bcrypt_verify'):
+            valid = self.hasher.verify_password(password, user['password_hash'])
+        
+        if valid:
+            AUTH_ATTEMPTS.inc(outcome='success')
+            # Chỉ nâng cost: worker khác cost không được băm qua lại, và không hạ cấp hash cũ
+            if (get_bcrypt_cost(user['password_hash']) or 0) < self.hasher.rounds:
+                self._schedule_rehash(user['id'], password, user['password_hash'])
             return {'success': True, 'user': user}
         else:
-            return {'success': False, 'message': 'Mật khẩu không đúng'}
+            AUTH_ATTEMPTS.inc(outcome='wrong_password')
+            return {'success': False, 'message': 'Mật khẩu không đúng',
+                    'user_id': user['id'], 'status': 'wrong_password'}
+    
+    def _schedule_rehash(self, user_id, password, old_hash):
+        """Đưa việc băm lại với cost hiện tại vào hàng đợi nền"""
+        with self._rehash_lock:
+            if user_id in self._rehash_pending:
+                return
+            self._rehash_pending.add(user_id)
+        self._rehash_executor.submit(self._rehash, user_id, password, old_hash)
+    
+    def _rehash(self, user_id, password, old_hash):
+        """Băm lại mật khẩu và lưu nếu user chưa đổi mật khẩu trong lúc đó"""
+        try:
+            new_hash = self.hasher.hash_password(password)
+            self.db.update_password_hash(user_id, new_hash, old_hash)
+        except (HashingBusyError, HashingTimeoutError):
+            # Đang quá tải: để lần đăng nhập sau thử lại
+            pass
+        except Exception as e:
+            print(f"❌ Lỗi băm lại mật khẩu: {str(e)}")
+        finally:
+            with self._rehash_lock:
+                self._rehash_pending.discard(user_id)
     
     def save_otp(self, user_id, otp_code, expiry_minutes=5):
         """Lưu mã OTP với thời gian hết hạn"""
-        expires_at = datetime.now() + timedelta(minutes=expiry_minutes)
-        self.db.save_otp(user_id, otp_code, expires_at)
+        with AUTH_STAGE_SECONDS.time(stage='otp_save'):
+            self.otp_store.save(user_id, otp_code, expiry_minutes * 60)
     
     def verify_otp(self, user_id, otp_code):
-        """Xác thực mã OTP"""
-        otp_record = self.db.get_valid_otp(user_id, otp_code)
-        
-        if otp_record:
-            # Đánh dấu OTP đã sử dụng
-            self.db.mark_otp_used(otp_record['id'])
-            return True
-        
-        return False
+        """Xác thực mã OTP và đánh dấu đã sử dụng"""
+        with AUTH_STAGE_SECONDS.time(stage='otp_verify'):
+            valid = self.otp_store.verify_and_consume(user_id, otp_code)
+        if not valid:
+            OTP_FAILURES.inc()
+        return valid
     
     def update_last_login(self, user_id):
         """Cập nhật thời gian đăng nhập cuối"""
@@ -68,32 +116,46 @@ class AuthService:
     
     def change_password(self, user_id, current_password, new_password):
         """Đổi mật khẩu"""
-        user = self.db.get_user_by_id(user_id)
+        user = self.db.get_user_by_id(user_id, use_cache=False)
         
         if not user:
             return {'success': False, 'message': 'User không tồn tại'}
         
         # Verify mật khẩu hiện tại
-        if not verify_password(current_password, user['password_hash']):
+        with AUTH_STAGE_SECONDS.time(stage='bcrypt_verify'):
+            valid = self.hasher.verify_password(current_password, user['password_hash'])
+        if not valid:
             return {'success': False, 'message': 'Mật khẩu hiện tại không đúng'}
         
         # Băm mật khẩu mới
-        password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        password_md5 = hash_password_md5(new_password)
-        password_sha256 = hash_password_sha256(new_password)
+        with AUTH_STAGE_SECONDS.time(stage='bcrypt_hash'):
+            password_hash = self.hasher.hash_password(new_password)
+        password_md5, password_sha256 = self._demo_hashes(new_password)
         
         # Cập nhật database
         self.db.update_password(user_id, password_hash, password_md5, password_sha256)
         
         return {'success': True, 'message': 'Đổi mật khẩu thành công'}
     
-    def get_password_hashes(self, user_id):
+    def _demo_hashes(self, password):
+        """Hash MD5/SHA-256 cần lưu theo profile hiện tại"""
+        if self.hash_profile != 'demo':
+            return None, None
+        return hash_password_md5(password), hash_password_sha256(password)
+    
+    def get_password_hashes(self, user_id, password=None):
         """Lấy các hash của mật khẩu (để demo)"""
         user = self.db.get_user_by_id(user_id)
         if user:
+            md5 = user['password_md5']
+            sha256 = user['password_sha256']
+            # Profile production không lưu hash demo: tính khi có mật khẩu gốc
+            if password is not None and (md5 is None or sha256 is None):
+                md5 = hash_password_md5(password)
+                sha256 = hash_password_sha256(password)
             return {
                 'bcrypt': user['password_hash'],
-                'md5': user['password_md5'],
-                'sha256': user['password_sha256']
+                'md5': md5,
+                'sha256': sha256
             }
         return None
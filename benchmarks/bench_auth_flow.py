@@ -0,0 +1,277 @@
+"""
+Benchmark end-to-end luồng đăng nhập
+Chạy register -> login -> verify-otp -> dashboard trên app Flask với nhiều user
+đồng thời (test client, không cần mạng), OTP lấy qua EmailService giả.
+Kèm micro-benchmark cho Database, AuthService và utils.
+Kết quả có thể ghi ra JSON và so sánh với baseline đã lưu (exit 1 nếu chậm đi)
+
+Chạy: python benchmarks/bench_auth_flow.py [--users 200] [--concurrency 16]
+      [--json result.json] [--baseline benchmarks/baseline.json] [--tolerance 0.2]
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STEPS = ('register', 'login', 'verify_otp', 'dashboard')
+PASSWORD = 'Bench#Passw0rd'
+
+
+def percentile(sorted_values, p):
+    """Percentile theo nearest-rank trên danh sách đã sắp xếp"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Throughput và p50/p95/p99 (ms) của một bước"""
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        'count': count,
+        'errors': errors,
+        'throughput': count / elapsed if elapsed > 0 else 0.0,
+        'mean_ms': sum(values) / count * 1000 if count else 0.0,
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+    }
+
+
+def configure_environment(args):
+    """Cấu hình trước khi import app: cost bcrypt cố định, không giới hạn tốc độ"""
+    os.environ.setdefault('BCRYPT_COST', str(args.bcrypt_cost))
+    os.environ.setdefault('HASH_MAX_QUEUE', str(max(args.users, args.concurrency) * 2))
+    os.environ.setdefault('SMTP_ENABLED', '0')
+    for rule in ('LOGIN_IP', 'LOGIN_EMAIL', 'OTP_IP', 'OTP_USER', 'RESEND_IP', 'RESEND_USER'):
+        os.environ.setdefault(f'RATE_LIMIT_{rule}', '1000000/60')
+
+
+def make_capturing_email_service():
+    """EmailService giả: giữ lại OTP theo email thay vì gửi"""
+    from email_service import EmailService
+
+    class CapturingEmailService(EmailService):
+        def __init__(self):
+            super().__init__()
+            self.otps = {}
+            self._cond = threading.Condition()
+
+        def send_otp_batch(self, items):
+            with self._cond:
+                for recipient_email, _, otp_code in items:
+                    self.otps[recipient_email] = otp_code
+                self._cond.notify_all()
+            return [None] * len(items)
+
+        def wait_otp(self, email, timeout=10):
+            """Chờ worker email gửi OTP của user, lấy ra một lần"""
+            with self._cond:
+                self._cond.wait_for(lambda: email in self.otps, timeout)
+                return self.otps.pop(email, None)
+
+    return CapturingEmailService()
+
+
+def run_flow(app, mailbox, users, concurrency):
+    """Chạy từng bước cho tất cả user (các bước cách nhau bởi barrier), trả về thống kê mỗi bước"""
+    clients = [app.test_client() for _ in range(users)]
+    emails = [f'bench{i}@example.com' for i in range(users)]
+
+    def register(i):
+        return clients[i].post('/register', data={
+            'username': f'bench{i}', 'email': emails[i], 'password': PASSWORD,
+            'confirm_password': PASSWORD,
+        }), 302
+
+    def login(i):
+        return clients[i].post('/login', data={'email': emails[i], 'password': PASSWORD}), 302
+
+    def verify_otp(i):
+        # Thời gian chờ worker email nằm trong độ trễ của bước này, như user thật chờ email
+        otp = mailbox.wait_otp(emails[i])
+        return clients[i].post('/verify-otp', data={'otp': otp or ''}), 302
+
+    def dashboard(i):
+        return clients[i].get('/dashboard'), 200
+
+    results = {}
+    for name, step in zip(STEPS, (register, login, verify_otp, dashboard)):
+        latencies = []
+        errors = []
+
+        def timed(i):
+            start = time.perf_counter()
+            response, expected = step(i)
+            latency = time.perf_counter() - start
+            if response.status_code == expected:
+                latencies.append(latency)
+            else:
+                errors.append(response.status_code)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(timed, range(users)))
+        elapsed = time.perf_counter() - start
+        results[name] = summarize(latencies, elapsed, len(errors))
+        if errors:
+            print(f"⚠️  {name}: {len(errors)} lỗi, status {sorted(set(errors))}")
+
+    total = sum(results[name]['mean_ms'] for name in STEPS)
+    results['total'] = {'count': users, 'mean_ms': total}
+    return results
+
+
+def micro(name, fn, iterations):
+    """Đo độ trễ từng lần gọi fn()"""
+    fn()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        call_start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - call_start)
+    return name, summarize(latencies, time.perf_counter() - start)
+
+
+def run_micro(db, auth_service, iterations):
+    """Micro-benchmark Database, AuthService và utils trên dữ liệu vừa tạo"""
+    import utils
+
+    user = db.get_user_by_email('bench0@example.com')
+    uid = user['id']
+    bcrypt_iterations = max(5, iterations // 100)
+
+    def otp_roundtrip():
+        auth_service.save_otp(uid, '123456')
+        auth_service.verify_otp(uid, '123456')
+
+    cases = [
+        ('utils.generate_otp', utils.generate_otp, iterations),
+        ('utils.hash_password_sha256', lambda: utils.hash_password_sha256(PASSWORD), iterations),
+        ('utils.validate_password_strength', lambda: utils.validate_password_strength(PASSWORD), iterations),
+        ('utils.validate_email', lambda: utils.validate_email('bench0@example.com'), iterations),
+        ('db.get_user_by_email.cached', lambda: db.get_user_by_email('bench0@example.com'), iterations),
+        ('db.get_user_by_email', lambda: db.get_user_by_email('bench0@example.com', use_cache=False), iterations),
+        ('db.get_user_by_id', lambda: db.get_user_by_id(uid, use_cache=False), iterations),
+        ('auth.otp_save_verify', otp_roundtrip, iterations),
+        ('auth.authenticate_user', lambda: auth_service.authenticate_user('bench0@example.com', PASSWORD),
+         bcrypt_iterations),
+    ]
+    return dict(micro(name, fn, n) for name, fn, n in cases)
+
+
+def compare(result, baseline, tolerance):
+    """So sánh với baseline: throughput giảm hoặc p95 tăng quá tolerance là regression"""
+    regressions = []
+    for section in ('flow', 'micro'):
+        for name, current in result.get(section, {}).items():
+            previous = baseline.get(section, {}).get(name)
+            if not previous:
+                continue
+            if previous.get('throughput') and current.get('throughput', 0) < previous['throughput'] * (1 - tolerance):
+                regressions.append(f"{section}.{name}: throughput {previous['throughput']:.1f} -> {current['throughput']:.1f}/s")
+            if previous.get('p95_ms') and current.get('p95_ms', 0) > previous['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{section}.{name}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+    return regressions
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"{'name':<34} {'count':>6} {'err':>4} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in rows.items():
+        if 'p50_ms' not in stats:
+            continue
+        print(f"{name:<34} {stats['count']:>6} {stats['errors']:>4} {stats['throughput']:>10.1f} "
+              f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--bcrypt-cost', type=int, default=10)
+    parser.add_argument('--iterations', type=int, default=2000, help='số lần gọi mỗi micro-benchmark')
+    parser.add_argument('--skip-micro', action='store_true')
+    parser.add_argument('--json', help='ghi kết quả ra file JSON')
+    parser.add_argument('--baseline', help='file JSON kết quả cũ để so sánh')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='mức chậm đi cho phép so với baseline (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    args.json = args.json and os.path.abspath(args.json)
+    args.baseline = args.baseline and os.path.abspath(args.baseline)
+    cwd = os.getcwd()
+
+    configure_environment(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Database mặc định là secure_auth.db trong thư mục hiện tại
+        os.chdir(tmp)
+        import services
+        from app import app
+
+        app.config['TESTING'] = True
+        # Test client chạy qua http, cookie Secure sẽ không được gửi lại
+        app.config['SESSION_COOKIE_SECURE'] = False
+        mailbox = make_capturing_email_service()
+        services.email_queue.email_service = mailbox
+        services.start_background_services()
+
+        try:
+            start = time.perf_counter()
+            flow = run_flow(app, mailbox, args.users, args.concurrency)
+            flow['total']['seconds'] = time.perf_counter() - start
+            result = {
+                'meta': {
+                    'users': args.users,
+                    'concurrency': args.concurrency,
+                    'bcrypt_cost': services.hasher.rounds,
+                    'hash_workers': services.hasher.workers,
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                },
+                'flow': flow,
+            }
+            if not args.skip_micro:
+                result['micro'] = run_micro(services.db, services.auth_service, args.iterations)
+        finally:
+            services.stop_background_services()
+            os.chdir(cwd)
+
+    print_table(f"Flow ({args.users} users, concurrency {args.concurrency}, "
+                f"bcrypt cost {result['meta']['bcrypt_cost']})", flow)
+    print(f"{'total':<34} {flow['total']['seconds']:>.2f}s, "
+          f"{args.users / flow['total']['seconds']:.1f} flows/s")
+    if 'micro' in result:
+        print_table('Micro-benchmarks', result['micro'])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\n💾 Đã ghi {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ Chậm hơn baseline quá {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"\n✅ Không có regression so với {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
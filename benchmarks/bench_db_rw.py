@@ -0,0 +1,82 @@
+"""
+Benchmark đọc/ghi hỗn hợp cho Database
+So sánh rollback journal (một pool chung) với WAL + tách kết nối đọc/ghi
+
+Chạy: python benchmarks/bench_db_rw.py [--threads 8] [--seconds 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from user_cache import UserCache
+
+CONFIGS = {
+    'rollback-journal': dict(journal_mode='DELETE', synchronous='FULL', read_pool_size=0,
+                             cache_size=-2000, mmap_size=0),
+    'wal-split': dict(journal_mode='WAL', synchronous='NORMAL'),
+}
+
+
+def run(config, threads, seconds, write_ratio):
+    """Chạy tải hỗn hợp trên một database tạm, trả về số thao tác mỗi giây"""
+    with tempfile.TemporaryDirectory() as tmp:
+        # Tắt cache user để đo đọc SQLite thật, không phải cache hit
+        db = Database(os.path.join(tmp, 'bench.db'), user_cache=UserCache(max_size=0), **config)
+        db.init_db()
+        for i in range(200):
+            db.create_user(f'user{i}', f'user{i}@example.com', 'x', 'x', 'x')
+
+        counts = {'read': 0, 'write': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + seconds
+        expires = datetime.now() + timedelta(minutes=5)
+
+        def worker(seed):
+            reads = writes = 0
+            n = seed
+            while time.monotonic() < deadline:
+                n += 1
+                user_id = n % 200 + 1
+                if n % 100 < write_ratio * 100:
+                    db.save_otp(user_id, '123456', expires)
+                    writes += 1
+                else:
+                    db.get_user_by_id(user_id)
+                    reads += 1
+            with lock:
+                counts['read'] += reads
+                counts['write'] += writes
+
+        workers = [threading.Thread(target=worker, args=(i * 7,)) for i in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        db.close()
+
+    return {k: v / seconds for k, v in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"{'config':<18}{'reads/s':>12}{'writes/s':>12}{'total/s':>12}")
+    for name, config in CONFIGS.items():
+        result = run(config, args.threads, args.seconds, args.write_ratio)
+        total = result['read'] + result['write']
+        print(f"{name:<18}{result['read']:>12.0f}{result['write']:>12.0f}{total:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
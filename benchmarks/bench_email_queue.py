@@ -0,0 +1,78 @@
+"""
+Benchmark hàng đợi email OTP
+So sánh gửi trực tiếp (như route login cũ) với enqueue + worker nền,
+đo qua fake SMTP server local
+
+Chạy: python benchmarks/bench_email_queue.py [--messages 200] [--latency 0.002]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+from email_queue import EmailQueue
+from email_service import EmailService
+from fake_smtp import FakeSMTPServer
+
+
+def make_service(port):
+    """EmailService gửi thật tới fake SMTP server"""
+    service = EmailService()
+    service.smtp_server = '127.0.0.1'
+    service.smtp_port = port
+    service.smtp_enabled = True
+    service.smtp_use_tls = False
+    return service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.002,
+                        help='độ trễ giả lập mỗi lệnh SMTP (giây)')
+    args = parser.parse_args()
+
+    server = FakeSMTPServer(latency=args.latency).start()
+    service = make_service(server.port)
+
+    # Trước: route chờ gửi xong mới trả về
+    start = time.perf_counter()
+    for i in range(args.messages):
+        service.send_otp_email(f'user{i}@example.com', f'user{i}', '123456')
+    direct = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        db.init_db()
+        queue = EmailQueue(db, service, workers=args.workers, poll_interval=0.05)
+        queue.start()
+
+        # Sau: route chỉ enqueue, worker gửi nền
+        start = time.perf_counter()
+        for i in range(args.messages):
+            queue.enqueue_otp(f'user{i}@example.com', f'user{i}', '123456')
+        enqueue = time.perf_counter() - start
+        while queue.stats().get('sent', 0) < args.messages:
+            time.sleep(0.01)
+        end_to_end = time.perf_counter() - start
+        queue.stop()
+        stats = queue.stats()
+        db.close()
+    server.stop()
+
+    print(f"direct send     : {direct / args.messages * 1000:8.2f} ms/request, "
+          f"{args.messages / direct:8.0f} msg/s")
+    print(f"enqueue (route) : {enqueue / args.messages * 1000:8.2f} ms/request")
+    print(f"queue end-to-end: {args.messages / end_to_end:8.0f} msg/s with {args.workers} workers")
+    print(f"outbox status   : {stats}")
+    print(f"smtp server     : {server.messages} messages, {server.connections} connections")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Micro-benchmark dựng email OTP
+So sánh cách cũ (tạo HTML + cây MIMEMultipart rồi serialize mỗi lần)
+với OTPEmailTemplate biên dịch sẵn
+
+Chạy: python benchmarks/bench_email_template.py [--messages 20000]
+"""
+import argparse
+import os
+import sys
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_templates import TEMPLATE_DIR, OTPEmailTemplate
+
+SENDER_NAME = 'Secure Auth System'
+SENDER_EMAIL = 'noreply@example.com'
+
+
+def legacy_builder():
+    """Cách cũ: dựng chuỗi HTML và cây MIME cho từng email"""
+    with open(os.path.join(TEMPLATE_DIR, 'otp.html'), encoding='utf-8') as f:
+        source = f.read()
+
+    def build(recipient_email, username, otp_code):
+        message = MIMEMultipart('alternative')
+        message['Subject'] = f'Mã OTP đăng nhập - {otp_code}'
+        message['From'] = f'{SENDER_NAME} <{SENDER_EMAIL}>'
+        message['To'] = recipient_email
+        html_content = source.replace('${username}', username).replace('${otp_code}', otp_code)
+        message.attach(MIMEText(html_content, 'html'))
+        return message.as_bytes()
+
+    return build
+
+
+def measure(build, messages):
+    start = time.perf_counter()
+    for i in range(messages):
+        build(f'user{i}@example.com', f'user{i}', f'{i % 1000000:06d}')
+    return messages / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    template = OTPEmailTemplate(SENDER_NAME, SENDER_EMAIL)
+    before = measure(legacy_builder(), args.messages)
+    after = measure(template.build, args.messages)
+
+    print(f"{'builder':<22}{'messages/s':>12}")
+    print(f"{'MIMEMultipart (old)':<22}{before:>12.0f}")
+    print(f"{'compiled template':<22}{after:>12.0f}")
+    print(f"speedup: {after / before:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark tra cứu OTP theo kích thước bảng otp_codes
+So sánh get_valid_otp khi có và không có idx_otp_codes_lookup
+
+Chạy: python benchmarks/bench_otp_index.py [--rows 1000000 3000000] [--lookups 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+USERS = 10000
+
+
+def fill(db, rows):
+    """Chèn `rows` mã OTP, phần lớn đã dùng hoặc hết hạn như dữ liệu thật"""
+    now = datetime.now()
+    rng = random.Random(42)
+    batch = []
+    with db.connection() as conn:
+        for i in range(rows):
+            expired = rng.random() < 0.9
+            expires_at = now - timedelta(minutes=10) if expired else now + timedelta(minutes=5)
+            batch.append((rng.randint(1, USERS), f'{rng.randrange(10**6):06d}', expires_at, int(expired)))
+            if len(batch) == 50000:
+                conn.executemany(
+                    'INSERT INTO otp_codes (user_id, otp_code, expires_at, is_used) VALUES (?, ?, ?, ?)',
+                    batch
+                )
+                batch.clear()
+        if batch:
+            conn.executemany(
+                'INSERT INTO otp_codes (user_id, otp_code, expires_at, is_used) VALUES (?, ?, ?, ?)',
+                batch
+            )
+
+
+def measure(db, lookups):
+    """Thời gian trung bình (µs) một lần get_valid_otp"""
+    rng = random.Random(7)
+    keys = [(rng.randint(1, USERS), f'{rng.randrange(10**6):06d}') for _ in range(lookups)]
+    start = time.perf_counter()
+    for user_id, code in keys:
+        db.get_valid_otp(user_id, code)
+    return (time.perf_counter() - start) / lookups * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000, 3000000])
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}{'no index (µs)':>16}{'index (µs)':>14}{'speedup':>10}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, 'bench.db'))
+            db.init_db()
+            fill(db, rows)
+
+            indexed = measure(db, args.lookups)
+            with db.connection() as conn:
+                conn.execute('DROP INDEX idx_otp_codes_lookup')
+            # Tra cứu quét toàn bảng nên giảm số lần đo
+            plain = measure(db, max(20, args.lookups // 100))
+            db.close()
+        print(f"{rows:>10}{plain:>16.1f}{indexed:>14.1f}{plain / indexed:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
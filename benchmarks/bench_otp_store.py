@@ -0,0 +1,63 @@
+"""
+Benchmark OTP store
+Số lần lưu + xác thực OTP mỗi giây với backend SQLite và bộ nhớ
+
+Chạy: python benchmarks/bench_otp_store.py [--threads 8] [--operations 20000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from otp_store import MemoryOTPStore, SQLiteOTPStore
+
+
+def run(store, threads, operations):
+    """Mỗi thread lặp: lưu OTP rồi xác thực; trả về số lần xác thực mỗi giây"""
+    per_thread = operations // threads
+    failures = []
+
+    def worker(offset):
+        for i in range(per_thread):
+            user_id = offset * per_thread + i + 1
+            code = f'{user_id % 1000000:06d}'
+            store.save(user_id, code, 300)
+            if not store.verify_and_consume(user_id, code):
+                failures.append(user_id)
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    assert not failures, f'{len(failures)} lần xác thực thất bại'
+    return per_thread * threads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        db.init_db()
+        sqlite_rate = run(SQLiteOTPStore(db), args.threads, args.operations // 10)
+        db.close()
+    memory_rate = run(MemoryOTPStore(), args.threads, args.operations)
+
+    print(f"{'backend':<10}{'verifications/s':>18}")
+    print(f"{'sqlite':<10}{sqlite_rate:>18.0f}")
+    print(f"{'memory':<10}{memory_rate:>18.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark kiểm tra mật khẩu
+So sánh validate_password_strength cũ (duyệt chuỗi 4 lần) với bản một lượt,
+và đo thời gian tra Bloom filter mật khẩu bị lộ (mmap) trên filter build tạm
+
+Chạy: python benchmarks/bench_password_check.py [--entries 1000000] [--count 200000]
+"""
+import argparse
+import os
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from breached import BreachedPasswords, build_filter, password_key
+from utils import validate_password_strength
+
+SAMPLES = ['Bench#Passw0rd', 'password123', 'ALLUPPERCASE1!', 'Mật-Khẩu-2024-Rất-Dài-Và-Khó-Đoán', 'short']
+
+
+def four_pass_strength(password):
+    """Bản cũ: mỗi loại ký tự duyệt lại toàn bộ chuỗi"""
+    if len(password) < 8:
+        return False
+    has_upper = any(c.isupper() for c in password)
+    has_lower = any(c.islower() for c in password)
+    has_digit = any(c.isdigit() for c in password)
+    has_special = any(c in string.punctuation for c in password)
+    return sum([has_upper, has_lower, has_digit, has_special]) >= 3
+
+
+def per_call_us(fn, count):
+    start = time.perf_counter()
+    for i in range(count):
+        fn(SAMPLES[i % len(SAMPLES)])
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=1000000, help='số mật khẩu trong filter')
+    parser.add_argument('--fp-rate', type=float, default=0.001)
+    parser.add_argument('--count', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'breached.bloom')
+        start = time.perf_counter()
+        keys = (password_key(f'leaked-{i}') for i in range(args.entries))
+        build_filter(keys, path, args.entries, args.fp_rate)
+        build_seconds = time.perf_counter() - start
+        breached = BreachedPasswords(path)
+
+        misses = sum(f'fresh-{i}' in breached for i in range(args.count))
+        print(f"filter: {args.entries} mục, {os.path.getsize(path) / 1024 / 1024:.1f} MiB, "
+              f"{breached.num_hashes} hàm băm, build {build_seconds:.1f}s, "
+              f"dương tính giả {misses / args.count:.4%}")
+
+        cases = [
+            ('4 lượt (cũ)', four_pass_strength),
+            ('1 lượt', validate_password_strength),
+            ('1 lượt + Bloom filter', lambda p: validate_password_strength(p, breached)),
+            ('chỉ tra Bloom filter', lambda p: p in breached),
+        ]
+        print(f"{'check':<28} {'µs/lần':>10}")
+        for name, fn in cases:
+            print(f"{name:<28} {per_call_us(fn, args.count):>10.2f}")
+        breached.close()
+
+
+if __name__ == '__main__':
+    main()
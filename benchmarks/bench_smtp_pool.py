@@ -0,0 +1,68 @@
+"""
+Benchmark pool phiên SMTP
+So sánh mở phiên mới cho mỗi email, dùng lại phiên trong pool và gửi theo lô
+trên fake SMTP server local (có độ trễ giả lập mỗi lệnh)
+
+Chạy: python benchmarks/bench_smtp_pool.py [--messages 200] [--latency 0.002]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from email_service import EmailService
+from fake_smtp import FakeSMTPServer
+from smtp_pool import SMTPConnectionPool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.002,
+                        help='độ trễ giả lập mỗi lệnh SMTP (giây)')
+    args = parser.parse_args()
+
+    server = FakeSMTPServer(latency=args.latency).start()
+    service = EmailService()
+    messages = [service.build_otp_message(f'user{i}@example.com', f'user{i}', '123456')
+                for i in range(args.messages)]
+
+    def pool(**kwargs):
+        return SMTPConnectionPool('127.0.0.1', server.port, username='bench', password='x',
+                                  use_tls=False, **kwargs)
+
+    # Trước: mỗi email một phiên (connect + EHLO + AUTH + QUIT)
+    fresh = pool(max_messages=1)
+    start = time.perf_counter()
+    for message in messages:
+        fresh.send(message)
+    results = {'new session per message': (time.perf_counter() - start, fresh.stats())}
+
+    reused = pool()
+    start = time.perf_counter()
+    for message in messages:
+        reused.send(message)
+    results['pooled session'] = (time.perf_counter() - start, reused.stats())
+
+    batched = pool()
+    start = time.perf_counter()
+    for i in range(0, len(messages), args.batch):
+        batched.send_many(messages[i:i + args.batch])
+    results[f'pooled, batches of {args.batch}'] = (time.perf_counter() - start, batched.stats())
+
+    for p in (fresh, reused, batched):
+        p.close()
+    server.stop()
+
+    print(f"{'mode':<28}{'msg/s':>10}{'ms/msg':>10}{'sessions':>10}{'reuse':>8}")
+    for name, (elapsed, stats) in results.items():
+        print(f"{name:<28}{args.messages / elapsed:>10.0f}{elapsed / args.messages * 1000:>10.2f}"
+              f"{stats['opened']:>10}{stats['reuse_rate']:>8.0%}")
+
+
+if __name__ == '__main__':
+    main()
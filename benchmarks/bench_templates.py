@@ -0,0 +1,88 @@
+"""
+Benchmark render template
+Mỗi template đo 3 trường hợp: cold (parse + biên dịch + render lần đầu),
+bytecode (worker mới nạp từ bytecode cache trên đĩa) và warm (template đã nạp)
+
+Chạy: python benchmarks/bench_templates.py [--rounds 20] [--renders 500]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USER = {
+    'id': 1, 'username': 'bench', 'email': 'bench@example.com', 'phone': '0900000000',
+    'password_hash': '$2b$12$' + 'x' * 53, 'password_md5': None, 'password_sha256': None,
+    'created_at': '2024-01-01 00:00:00', 'last_login': '2024-01-02 00:00:00', 'is_active': 1,
+}
+CONTEXT = {'user': USER, 'email': USER['email'], 'otp_length': 6,
+           'otp_pattern': '[0-9]{6}', 'otp_numeric': True}
+
+
+def load_and_render(app, name, bytecode_cache):
+    """Environment mới (như worker vừa khởi động): nạp template và render một lần"""
+    env = app.create_jinja_environment()
+    env.bytecode_cache = bytecode_cache
+    start = time.perf_counter()
+    template = env.get_template(name)
+    template.render(CONTEXT)
+    return time.perf_counter() - start, template
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20, help='số lần đo cold/bytecode mỗi template')
+    parser.add_argument('--renders', type=int, default=500, help='số lần render warm mỗi template')
+    args = parser.parse_args()
+
+    from jinja2 import FileSystemBytecodeCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Session dùng database secure_auth.db trong thư mục hiện tại
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        os.environ.setdefault('TEMPLATE_PRECOMPILE', '0')
+        os.environ.setdefault('TEMPLATE_CACHE_DIR', os.path.join(tmp, 'app_cache'))
+        import services
+        from app import app
+        from templating import page_templates
+        services.db.init_db()
+
+        cache_dir = os.path.join(tmp, 'bench_cache')
+        rows = []
+        with app.test_request_context('/'):
+            for name in page_templates(app.jinja_env):
+                cold, bytecode = [], []
+                for _ in range(args.rounds):
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+                    os.makedirs(cache_dir)
+                    cache = FileSystemBytecodeCache(cache_dir)
+                    # Lần đầu: biên dịch và ghi bytecode; lần sau: worker mới đọc bytecode
+                    cold.append(load_and_render(app, name, cache)[0])
+                    elapsed, template = load_and_render(app, name, cache)
+                    bytecode.append(elapsed)
+
+                start = time.perf_counter()
+                for _ in range(args.renders):
+                    template.render(CONTEXT)
+                warm = (time.perf_counter() - start) / args.renders
+                rows.append((name, statistics.median(cold), statistics.median(bytecode), warm))
+        services.stop_background_services()
+        os.chdir(cwd)
+
+    print(f"{'template':<20} {'cold ms':>10} {'bytecode ms':>12} {'warm ms':>10} {'cold/warm':>10}")
+    for name, cold, bytecode, warm in rows:
+        print(f"{name:<20} {cold * 1000:>10.3f} {bytecode * 1000:>12.3f} {warm * 1000:>10.3f} "
+              f"{cold / warm:>9.1f}x")
+    print(f"{'total':<20} {sum(r[1] for r in rows) * 1000:>10.3f} "
+          f"{sum(r[2] for r in rows) * 1000:>12.3f} {sum(r[3] for r in rows) * 1000:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
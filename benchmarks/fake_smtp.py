@@ -0,0 +1,77 @@
+"""
+Fake SMTP Server
+Server SMTP tối giản chạy local để benchmark gửi email mà không cần mạng
+Hỗ trợ EHLO/HELO, AUTH (chấp nhận mọi thông tin), MAIL, RCPT, DATA, RSET, NOOP, QUIT
+"""
+import socketserver
+import threading
+import time
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self._reply('220 fake-smtp ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if server.latency:
+                time.sleep(server.latency)
+
+            if verb in ('EHLO', 'HELO'):
+                self._reply('250-fake-smtp')
+                self._reply('250-AUTH PLAIN LOGIN')
+                self._reply('250 PIPELINING')
+            elif verb == 'AUTH':
+                self._reply('235 authenticated')
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self._reply('250 ok')
+            elif verb == 'DATA':
+                self._reply('354 end with .')
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b'.\r\n', b'.\n'):
+                        break
+                with server.lock:
+                    server.messages += 1
+                self._reply('250 queued')
+            elif verb == 'QUIT':
+                self._reply('221 bye')
+                return
+            else:
+                self._reply('502 not implemented')
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """Đếm số kết nối và số message nhận được; latency giả lập độ trễ mạng mỗi lệnh"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        super().__init__((host, port), _SMTPHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
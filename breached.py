@@ -0,0 +1,176 @@
+"""
+Breached Passwords
+Bloom filter các mật khẩu đã bị lộ, lưu thành một file nhỏ gọn và đọc qua mmap:
+mọi worker dùng chung page cache của hệ điều hành, mỗi lần tra chỉ đọc vài byte.
+Khóa là SHA-1 của mật khẩu nên có thể build từ danh sách mật khẩu thường
+hoặc danh sách hash SHA-1 (định dạng HASH:COUNT của Have I Been Pwned).
+
+Chạy: python breached.py build passwords.txt --expected 10000000 [--fp-rate 0.001]
+      python breached.py check 'P@ssw0rd'
+"""
+import argparse
+import hashlib
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+
+MAGIC = b'BLOOMPW1'
+# magic, số bit, số hàm băm, số mật khẩu đã thêm
+HEADER = struct.Struct('<8sQIQ')
+# Hai số 64 bit đầu của SHA-1 cho double hashing
+KEY_HALVES = struct.Struct('<QQ')
+KEY_SIZE = hashlib.sha1().digest_size
+INPUT_FORMATS = ('plain', 'sha1')
+
+
+def password_key(password):
+    """SHA-1 (20 byte) của mật khẩu, khóa dùng trong filter"""
+    return hashlib.sha1(password.encode('utf-8')).digest()
+
+
+def _positions(key, num_bits, num_hashes):
+    """Vị trí bit theo double hashing (Kirsch-Mitzenmacher) từ hai nửa của SHA-1"""
+    h1, h2 = KEY_HALVES.unpack_from(key)
+    h2 |= 1
+    return [(h1 + i * h2) % num_bits for i in range(num_hashes)]
+
+
+def filter_size(expected, fp_rate):
+    """(số bit, số hàm băm) tối ưu cho số phần tử và tỉ lệ dương tính giả mong muốn"""
+    expected = max(1, expected)
+    num_bits = math.ceil(-expected * math.log(fp_rate) / math.log(2) ** 2)
+    num_bits = (num_bits + 7) // 8 * 8
+    num_hashes = max(1, round(num_bits / expected * math.log(2)))
+    return num_bits, num_hashes
+
+
+def iter_keys(lines, fmt='plain'):
+    """Khóa SHA-1 từ từng dòng: mật khẩu thường hoặc hash SHA-1 hex (HASH[:COUNT])"""
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line:
+            continue
+        if fmt == 'sha1':
+            try:
+                key = bytes.fromhex(line.split(':', 1)[0].strip())
+            except ValueError:
+                continue
+            # Hex hợp lệ nhưng không đủ 20 byte (dòng hỏng) thì bỏ qua như dòng không phải hex
+            if len(key) == KEY_SIZE:
+                yield key
+        else:
+            yield password_key(line)
+
+
+def build_filter(keys, path, expected, fp_rate=0.001):
+    """Ghi filter ra file (qua file tạm rồi đổi tên), trả về số khóa đã thêm.
+    Mảng bit được ghi thẳng qua mmap nên không cần giữ cả filter trong RAM"""
+    num_bits, num_hashes = filter_size(expected, fp_rate)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    count = 0
+    with open(tmp, 'w+b') as f:
+        f.truncate(HEADER.size + num_bits // 8)
+        with mmap.mmap(f.fileno(), 0) as mm:
+            offset = HEADER.size
+            for key in keys:
+                for pos in _positions(key, num_bits, num_hashes):
+                    mm[offset + (pos >> 3)] |= 1 << (pos & 7)
+                count += 1
+            mm[:HEADER.size] = HEADER.pack(MAGIC, num_bits, num_hashes, count)
+            mm.flush()
+    os.replace(tmp, path)
+    return count
+
+
+class BreachedPasswords:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.num_bits, self.num_hashes, self.count = HEADER.unpack_from(self._mm)
+        if magic != MAGIC or len(self._mm) < HEADER.size + self.num_bits // 8:
+            self._mm.close()
+            raise ValueError(f'File Bloom filter không hợp lệ: {path}')
+
+    @classmethod
+    def open(cls, path=None):
+        """Mở filter theo BREACHED_PASSWORDS_FILE, None nếu chưa build"""
+        path = path or os.getenv('BREACHED_PASSWORDS_FILE', 'breached_passwords.bloom')
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Không mở được danh sách mật khẩu bị lộ: {str(e)}")
+            return None
+
+    def contains_key(self, key):
+        """Dừng ngay ở bit đầu tiên chưa bật: mật khẩu không bị lộ thường chỉ cần 1-2 lần đọc"""
+        mm = self._mm
+        num_bits = self.num_bits
+        h1, h2 = KEY_HALVES.unpack_from(key)
+        h2 |= 1
+        for i in range(self.num_hashes):
+            pos = (h1 + i * h2) % num_bits
+            if not mm[HEADER.size + (pos >> 3)] >> (pos & 7) & 1:
+                return False
+        return True
+
+    def __contains__(self, password):
+        """True nếu mật khẩu (có thể) nằm trong danh sách bị lộ"""
+        return self.contains_key(password_key(password))
+
+    def close(self):
+        self._mm.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bloom filter mật khẩu bị lộ')
+    parser.add_argument('--filter', default=os.getenv('BREACHED_PASSWORDS_FILE', 'breached_passwords.bloom'))
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Build filter từ danh sách mật khẩu (mỗi dòng một mục)')
+    build.add_argument('path', help="file nguồn ('-' = stdin)")
+    build.add_argument('--format', choices=INPUT_FORMATS, default='plain',
+                       help='plain: mật khẩu thường; sha1: hash SHA-1 hex (HASH[:COUNT])')
+    build.add_argument('--expected', type=int,
+                       help='số dòng ước tính (mặc định đếm trước một lượt, bắt buộc với stdin)')
+    build.add_argument('--fp-rate', type=float, default=0.001, help='tỉ lệ dương tính giả')
+
+    check = sub.add_parser('check', help='Kiểm tra một mật khẩu')
+    check.add_argument('password')
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        breached = BreachedPasswords(args.filter)
+        start = time.perf_counter()
+        found = args.password in breached
+        elapsed = (time.perf_counter() - start) * 1e6
+        print(f"{'❌ Đã bị lộ' if found else '✅ Không có trong danh sách'} ({elapsed:.1f} µs)")
+        sys.exit(1 if found else 0)
+
+    expected = args.expected
+    if expected is None:
+        if args.path == '-':
+            parser.error('--expected là bắt buộc khi đọc từ stdin')
+        with open(args.path, 'rb') as f:
+            expected = sum(1 for _ in f)
+
+    start = time.perf_counter()
+    if args.path == '-':
+        count = build_filter(iter_keys(sys.stdin, args.format), args.filter, expected, args.fp_rate)
+    else:
+        with open(args.path, encoding='utf-8', errors='replace') as f:
+            count = build_filter(iter_keys(f, args.format), args.filter, expected, args.fp_rate)
+    size = os.path.getsize(args.filter)
+    print(f"✅ {count} mật khẩu -> {args.filter} ({size / 1024 / 1024:.1f} MiB) "
+          f"trong {time.perf_counter() - start:.1f}s")
+    if count > expected:
+        print(f"⚠️  Nhiều hơn --expected ({expected}), tỉ lệ dương tính giả sẽ cao hơn {args.fp_rate}")
+
+
+if __name__ == '__main__':
+    main()
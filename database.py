@@ -3,83 +3,317 @@ Database Module
 Quản lý kết nối và thao tác với SQLite database
 """
 import sqlite3
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import os
+import re
+
+from metrics import metrics, DB_QUERY_SECONDS
+from migrations import run_migrations
+from user_cache import UserCache
+
+
+USER_LIST_COLUMNS = ('id', 'username', 'email', 'phone', 'created_at', 'last_login', 'is_active')
+USER_SORT_KEYS = ('id', 'created_at', 'last_login')
+_PHONE_QUERY = re.compile(r'[\d\s().+-]+')
+
+
+def fts_query(text):
+    """Chuyển chuỗi tìm kiếm thành biểu thức FTS5: mọi từ đều khớp theo tiền tố (AND)
+    Số điện thoại được bỏ dấu phân cách như lúc index. None nếu không có từ nào"""
+    if _PHONE_QUERY.fullmatch(text) and any(c.isdigit() for c in text):
+        words = [''.join(c for c in text if c.isdigit())]
+    else:
+        words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _user_filters(prefix, is_active, created_after, created_before, last_login_after, last_login_before):
+    """Điều kiện WHERE (danh sách) và tham số cho các bộ lọc user đã truyền"""
+    where, params = [], []
+    for condition, value in (('is_active = ?', None if is_active is None else int(is_active)),
+                             ('created_at >= ?', created_after), ('created_at < ?', created_before),
+                             ('last_login >= ?', last_login_after), ('last_login < ?', last_login_before)):
+        if value is not None:
+            where.append(prefix + condition)
+            params.append(value)
+    return where, params
+
+
+class PoolTimeoutError(Exception):
+    """Không lấy được kết nối từ pool trong thời gian cho phép"""
+    pass
+
+
+class ConnectionPool:
+    """Pool kết nối SQLite có giới hạn, mỗi kết nối chỉ được một thread dùng tại một thời điểm"""
+
+    def __init__(self, db_name, size=5, timeout=10.0, health_check_interval=30.0,
+                 pragmas=None, read_only=False):
+        self.db_name = db_name
+        self.size = size
+        self.pragmas = pragmas or {}
+        self.read_only = read_only
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'checkout_time_total': 0.0,
+            'checkout_time_max': 0.0,
+        }
+
+    def _connect(self):
+        """Mở một kết nối mới"""
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        if self.read_only:
+            conn.execute('PRAGMA query_only = ON')
+        return conn
+
+    def _is_healthy(self, conn):
+        """Kiểm tra kết nối còn dùng được không"""
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        """Bỏ một kết nối hỏng và giải phóng chỗ trong pool"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._stats['discarded'] += 1
+
+    def _acquire(self):
+        """Lấy kết nối rảnh hoặc tạo mới nếu pool chưa đầy"""
+        if self._closed:
+            raise PoolTimeoutError('Pool đã đóng')
+
+        try:
+            conn, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                with self._lock:
+                    self._stats['created'] += 1
+                return conn
+            try:
+                conn, last_used = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise PoolTimeoutError(
+                    f'Hết thời gian chờ kết nối database ({self.timeout}s)'
+                )
+
+        # Health check cho kết nối để rảnh quá lâu
+        if time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(conn):
+            self._discard(conn)
+            return self._acquire()
+        return conn
+
+    def _release(self, conn):
+        """Trả kết nối về pool"""
+        if self._closed:
+            self._discard(conn)
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put_nowait((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """Mượn một kết nối: commit khi thành công, rollback khi có lỗi"""
+        wait_start = time.monotonic()
+        conn = self._acquire()
+        checkout_start = time.monotonic()
+        wait = checkout_start - wait_start
+        try:
+            yield conn
+            conn.commit()
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.rollback()
+            # Kết nối có thể đã hỏng, kiểm tra trước khi trả lại
+            if isinstance(e, sqlite3.Error) and not self._is_healthy(conn):
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            held = time.monotonic() - checkout_start
+            with self._lock:
+                stats = self._stats
+                stats['checkouts'] += 1
+                stats['wait_time_total'] += wait
+                stats['wait_time_max'] = max(stats['wait_time_max'], wait)
+                stats['checkout_time_total'] += held
+                stats['checkout_time_max'] = max(stats['checkout_time_max'], held)
+            if conn is not None:
+                self._release(conn)
+
+    def stats(self):
+        """Thống kê pool: số lần mượn, thời gian chờ và thời gian giữ kết nối"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._created
+        stats['idle'] = self._idle.qsize()
+        stats['in_use'] = stats['open'] - stats['idle']
+        checkouts = stats['checkouts'] or 1
+        stats['wait_time_avg'] = stats['wait_time_total'] / checkouts
+        stats['checkout_time_avg'] = stats['checkout_time_total'] / checkouts
+        return stats
+
+    def close(self):
+        """Đóng tất cả kết nối đang rảnh; kết nối đang mượn sẽ bị đóng khi trả về"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
 
 class Database:
-    def __init__(self, db_name='secure_auth.db'):
+    def __init__(self, db_name='secure_auth.db', pool_size=None, pool_timeout=None,
+                 read_pool_size=None, journal_mode=None, synchronous=None,
+                 cache_size=None, mmap_size=None, busy_timeout=None, user_cache=None):
         self.db_name = db_name
-        self.conn = None
+        self.user_cache = user_cache or UserCache()
+        # Callback(user_id) khi bản ghi user thay đổi, vd. xóa cache trang đã render
+        self._user_listeners = []
+        # pool_size: số kết nối ghi (SQLite chỉ cho một writer tại một thời điểm)
+        self.pool_size = pool_size if pool_size is not None else int(os.getenv('DB_POOL_SIZE', '1'))
+        # read_pool_size = 0: đọc chung kết nối với ghi (không tách)
+        self.read_pool_size = (read_pool_size if read_pool_size is not None
+                               else int(os.getenv('DB_READ_POOL_SIZE', '4')))
+        self.pool_timeout = pool_timeout or float(os.getenv('DB_POOL_TIMEOUT', '10'))
+        self.journal_mode = journal_mode or os.getenv('DB_JOURNAL_MODE', 'WAL')
+        self.pragmas = {
+            'synchronous': synchronous or os.getenv('DB_SYNCHRONOUS', 'NORMAL'),
+            'cache_size': cache_size if cache_size is not None else int(os.getenv('DB_CACHE_SIZE', '-16000')),
+            'mmap_size': mmap_size if mmap_size is not None else int(os.getenv('DB_MMAP_SIZE', '134217728')),
+            'busy_timeout': busy_timeout if busy_timeout is not None else int(os.getenv('DB_BUSY_TIMEOUT', '5000')),
+        }
+        self.pool = None
+        self.read_pool = None
+        self._pool_lock = threading.Lock()
+    
+    def _get_pool(self):
+        """Tạo pool kết nối ghi khi cần"""
+        if self.pool is None:
+            with self._pool_lock:
+                if self.pool is None:
+                    # journal_mode được lưu trong file nên chỉ cần đặt ở kết nối ghi
+                    pragmas = dict(self.pragmas, journal_mode=self.journal_mode)
+                    self.pool = ConnectionPool(
+                        self.db_name, size=self.pool_size, timeout=self.pool_timeout,
+                        pragmas=pragmas
+                    )
+        return self.pool
+    
+    def _get_read_pool(self):
+        """Tạo pool kết nối chỉ đọc khi cần"""
+        if self.read_pool_size <= 0:
+            return self._get_pool()
+        if self.read_pool is None:
+            # Đảm bảo file đã ở chế độ WAL trước khi mở kết nối đọc
+            self._get_pool()
+            with self._pool_lock:
+                if self.read_pool is None:
+                    self.read_pool = ConnectionPool(
+                        self.db_name, size=self.read_pool_size, timeout=self.pool_timeout,
+                        pragmas=self.pragmas, read_only=True
+                    )
+        return self.read_pool
+    
+    def connection(self, query='other'):
+        """Mượn một kết nối ghi từ pool (dùng với `with`), query là nhãn metric của truy vấn"""
+        if not metrics.enabled:
+            return self._get_pool().connection()
+        return self._timed(self._get_pool(), query)
+    
+    def read_connection(self, query='other'):
+        """Mượn một kết nối chỉ đọc, không phải chờ writer khi ở chế độ WAL"""
+        if not metrics.enabled:
+            return self._get_read_pool().connection()
+        return self._timed(self._get_read_pool(), query)
+    
+    @contextmanager
+    def _timed(self, pool, query):
+        """Đo thời gian mượn kết nối + chạy truy vấn, gắn nhãn query"""
+        with DB_QUERY_SECONDS.time(query=query):
+            with pool.connection() as conn:
+                yield conn
     
-    def get_connection(self):
-        """Tạo kết nối đến database"""
-        if self.conn is None:
-            self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
-            self.conn.row_factory = sqlite3.Row
-        return self.conn
+    def on_user_change(self, callback):
+        """Đăng ký callback(user_id) gọi sau khi user bị cập nhật (user_id None = nhiều user)"""
+        self._user_listeners.append(callback)
+    
+    def _user_changed(self, user_id):
+        """Xóa user khỏi cache và báo cho các listener"""
+        if user_id is None:
+            self.user_cache.clear()
+        else:
+            self.user_cache.invalidate(user_id)
+        for callback in self._user_listeners:
+            callback(user_id)
+    
+    def pool_stats(self):
+        """Thống kê các pool kết nối"""
+        stats = {'writer': self._get_pool().stats()}
+        if self.read_pool_size > 0:
+            stats['reader'] = self._get_read_pool().stats()
+        return stats
     
     def init_db(self):
-        """Khởi tạo database và các bảng"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Bảng users
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                phone TEXT,
-                password_hash TEXT NOT NULL,
-                password_md5 TEXT NOT NULL,
-                password_sha256 TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP,
-                is_active BOOLEAN DEFAULT 1
-            )
-        ''')
-        
-        # Bảng OTP
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS otp_codes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                otp_code TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP NOT NULL,
-                is_used BOOLEAN DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Bảng login history
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS login_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                ip_address TEXT,
-                user_agent TEXT,
-                status TEXT,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        conn.commit()
+        """Khởi tạo database và chạy các migration còn thiếu"""
+        with self.connection('init_db') as conn:
+            run_migrations(conn)
         print("✅ Database initialized successfully")
     
-    def create_user(self, username, email, password_hash, password_md5, password_sha256, phone=''):
+    def create_user(self, username, email, password_hash, password_md5=None, password_sha256=None, phone=''):
         """Tạo user mới"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO users (username, email, phone, password_hash, password_md5, password_sha256)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (username, email, phone, password_hash, password_md5, password_sha256))
-            
-            conn.commit()
+            with self.connection('create_user') as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    INSERT INTO users (username, email, phone, password_hash, password_md5, password_sha256)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (username, email, phone, password_hash, password_md5, password_sha256))
+                
+            self.user_cache.invalidate(cursor.lastrowid, email)
             return {'success': True, 'user_id': cursor.lastrowid}
         except sqlite3.IntegrityError as e:
             if 'username' in str(e):
@@ -91,84 +325,489 @@ class Database:
         except Exception as e:
             return {'success': False, 'message': f'Lỗi: {str(e)}'}
     
-    def get_user_by_email(self, email):
+    def _existing_users(self, conn, emails, usernames):
+        """Tập email và username trong danh sách đã có trong bảng users"""
+        existing_emails, existing_usernames = set(), set()
+        if emails:
+            marks = ','.join('?' * len(emails))
+            existing_emails = {row[0] for row in conn.execute(
+                f'SELECT email FROM users WHERE email IN ({marks})', list(emails))}
+        if usernames:
+            marks = ','.join('?' * len(usernames))
+            existing_usernames = {row[0] for row in conn.execute(
+                f'SELECT username FROM users WHERE username IN ({marks})', list(usernames))}
+        return existing_emails, existing_usernames
+    
+    def find_existing_users(self, emails, usernames):
+        """Kiểm tra trùng trước khi băm mật khẩu (không khóa, chỉ để bỏ qua sớm)"""
+        with self.read_connection('find_existing_users') as conn:
+            return self._existing_users(conn, set(emails), set(usernames))
+    
+    def create_users_bulk(self, users):
+        """Tạo nhiều user trong một transaction bằng executemany
+        users: [(username, email, phone, password_hash, password_md5, password_sha256)]
+        Trả về danh sách lỗi tương ứng từng user (None nếu tạo thành công)"""
+        errors = [None] * len(users)
+        with self.connection('create_users_bulk') as conn:
+            # Giữ khóa ghi từ lúc kiểm tra trùng tới lúc insert để worker khác không chen vào
+            conn.execute('BEGIN IMMEDIATE')
+            existing_emails, existing_usernames = self._existing_users(
+                conn, {user[1] for user in users}, {user[0] for user in users})
+            rows = []
+            for i, user in enumerate(users):
+                username, email = user[0], user[1]
+                if username in existing_usernames:
+                    errors[i] = 'Tên đăng nhập đã tồn tại'
+                elif email in existing_emails:
+                    errors[i] = 'Email đã được sử dụng'
+                else:
+                    # Trùng trong cùng lô cũng bị từ chối như trùng với database
+                    existing_usernames.add(username)
+                    existing_emails.add(email)
+                    rows.append(user)
+            conn.executemany('''
+                INSERT INTO users (username, email, phone, password_hash, password_md5, password_sha256)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+        for user in rows:
+            self.user_cache.invalidate(email=user[1])
+        return errors
+    
+    def iter_users(self, batch_size=1000, include_hash=False):
+        """Duyệt toàn bộ user theo id, mỗi trang một lần đọc ngắn"""
+        columns = ', '.join(USER_LIST_COLUMNS)
+        if include_hash:
+            columns += ', password_hash'
+        last_id = 0
+        while True:
+            with self.read_connection('iter_users') as conn:
+                rows = conn.execute(f'''
+                    SELECT {columns} FROM users WHERE id > ? ORDER BY id LIMIT ?
+                ''', (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            last_id = rows[-1]['id']
+    
+    def list_users(self, is_active=None, created_after=None, created_before=None,
+                   last_login_after=None, last_login_before=None, sort='id', descending=False,
+                   after=None, limit=50):
+        """Một trang user theo bộ lọc, phân trang keyset: after = (giá trị sort, id) của
+        dòng cuối trang trước (sort='id': chỉ id), nên trang sâu vẫn chỉ đọc limit dòng qua index.
+        Sắp theo last_login chỉ gồm user đã từng đăng nhập.
+        Thời gian dạng 'YYYY-MM-DD[ HH:MM:SS]' (UTC), khoảng after <= t < before"""
+        if sort not in USER_SORT_KEYS:
+            raise ValueError(f'Không sắp xếp được theo {sort}')
+        where, params = _user_filters('', is_active, created_after, created_before,
+                                      last_login_after, last_login_before)
+        if sort == 'last_login':
+            where.append('last_login IS NOT NULL')
+        
+        op = '<' if descending else '>'
+        if after is not None:
+            if sort == 'id':
+                where.append(f'id {op} ?')
+                params.append(after)
+            else:
+                where.append(f'({sort}, id) {op} (?, ?)')
+                params.extend(after)
+        direction = 'DESC' if descending else 'ASC'
+        order = 'id' if sort == 'id' else f'{sort} {direction}, id'
+        sql = f'''
+            SELECT {', '.join(USER_LIST_COLUMNS)} FROM users
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            ORDER BY {order} {direction} LIMIT ?
+        '''
+        with self.read_connection('list_users') as conn:
+            rows = conn.execute(sql, params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+    
+    def search_users(self, text, is_active=None, created_after=None, created_before=None,
+                     last_login_after=None, last_login_before=None, after_id=None, limit=50):
+        """Tìm user theo tiền tố các từ trong username, email, phone (index FTS5),
+        cùng bộ lọc với list_users, sắp theo id và phân trang keyset theo id"""
+        match = fts_query(text)
+        if match is None:
+            return []
+        where, params = _user_filters('u.', is_active, created_after, created_before,
+                                      last_login_after, last_login_before)
+        where.insert(0, 'users_fts MATCH ?')
+        params.insert(0, match)
+        if after_id is not None:
+            where.append('f.rowid > ?')
+            params.append(after_id)
+        columns = ', '.join(f'u.{column}' for column in USER_LIST_COLUMNS)
+        with self.read_connection('search_users') as conn:
+            rows = conn.execute(f'''
+                SELECT {columns} FROM users_fts f JOIN users u ON u.id = f.rowid
+                WHERE {' AND '.join(where)}
+                ORDER BY f.rowid LIMIT ?
+            ''', params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+    
+    def get_user_by_email(self, email, use_cache=True):
         """Lấy thông tin user theo email"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+        if use_cache:
+            user = self.user_cache.get_by_email(email)
+            if user is not None:
+                return user
+        with self.read_connection('get_user_by_email') as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
+            row = cursor.fetchone()
+        user = dict(row) if row else None
+        self.user_cache.put(user)
+        return user
     
-    def get_user_by_id(self, user_id):
+    def get_user_by_id(self, user_id, use_cache=True):
         """Lấy thông tin user theo ID"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+        if use_cache:
+            user = self.user_cache.get(user_id)
+            if user is not None:
+                return user
+        with self.read_connection('get_user_by_id') as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+            row = cursor.fetchone()
+        user = dict(row) if row else None
+        self.user_cache.put(user)
+        return user
     
     def update_last_login(self, user_id):
         """Cập nhật thời gian đăng nhập cuối"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?
-        ''', (user_id,))
-        conn.commit()
+        with self.connection('update_last_login') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?
+            ''', (user_id,))
+        self._user_changed(user_id)
     
     def save_otp(self, user_id, otp_code, expires_at):
         """Lưu mã OTP"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO otp_codes (user_id, otp_code, expires_at)
-            VALUES (?, ?, ?)
-        ''', (user_id, otp_code, expires_at))
-        conn.commit()
+        with self.connection('save_otp') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO otp_codes (user_id, otp_code, expires_at)
+                VALUES (?, ?, ?)
+            ''', (user_id, otp_code, expires_at))
     
     def get_valid_otp(self, user_id, otp_code):
         """Lấy OTP hợp lệ"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM otp_codes 
-            WHERE user_id = ? AND otp_code = ? AND is_used = 0 
-            AND expires_at > CURRENT_TIMESTAMP
-            ORDER BY created_at DESC LIMIT 1
-        ''', (user_id, otp_code))
-        row = cursor.fetchone()
+        with self.read_connection('get_valid_otp') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM otp_codes 
+                WHERE user_id = ? AND otp_code = ? AND is_used = 0 
+                AND expires_at > CURRENT_TIMESTAMP
+                ORDER BY created_at DESC LIMIT 1
+            ''', (user_id, otp_code))
+            row = cursor.fetchone()
         return dict(row) if row else None
     
     def mark_otp_used(self, otp_id):
         """Đánh dấu OTP đã sử dụng"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE otp_codes SET is_used = 1 WHERE id = ?', (otp_id,))
-        conn.commit()
+        with self.connection('mark_otp_used') as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE otp_codes SET is_used = 1 WHERE id = ?', (otp_id,))
+    
+    def consume_otp(self, user_id, otp_code):
+        """Đánh dấu đã dùng OTP hợp lệ mới nhất, trả về True nếu có mã được dùng"""
+        with self.connection('consume_otp') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE otp_codes SET is_used = 1
+                WHERE id = (
+                    SELECT id FROM otp_codes
+                    WHERE user_id = ? AND otp_code = ? AND is_used = 0
+                    AND expires_at > CURRENT_TIMESTAMP
+                    ORDER BY created_at DESC LIMIT 1
+                )
+            ''', (user_id, otp_code))
+            return cursor.rowcount == 1
     
     def add_login_history(self, user_id, ip_address, user_agent, status):
         """Thêm lịch sử đăng nhập"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO login_history (user_id, ip_address, user_agent, status)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, ip_address, user_agent, status))
-        conn.commit()
+        with self.connection('add_login_history') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO login_history (user_id, ip_address, user_agent, status)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, ip_address, user_agent, status))
     
-    def update_password(self, user_id, password_hash, password_md5, password_sha256):
+    def write_login_audit(self, history_rows, last_logins):
+        """Ghi một lô lịch sử đăng nhập và last_login trong một transaction
+        history_rows: [(user_id, email, ip, user_agent, status, login_time)], user_id None = email không tồn tại
+        last_logins: [(user_id, login_time)]"""
+        with self.connection('write_login_audit') as conn:
+            conn.executemany('''
+                INSERT INTO login_history (user_id, email, ip_address, user_agent, status, login_time)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', history_rows)
+            conn.executemany('''
+                UPDATE users SET last_login = ? WHERE id = ?
+            ''', [(login_time, user_id) for user_id, login_time in last_logins])
+        for user_id, _ in last_logins:
+            self._user_changed(user_id)
+    
+    def update_password(self, user_id, password_hash, password_md5=None, password_sha256=None):
         """Cập nhật mật khẩu"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection('update_password') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE users 
+                SET password_hash = ?, password_md5 = ?, password_sha256 = ?
+                WHERE id = ?
+            ''', (password_hash, password_md5, password_sha256, user_id))
+        self._user_changed(user_id)
+    
+    def clear_demo_hashes(self, batch_size=1000):
+        """Xóa các hash MD5/SHA-256 demo đã lưu, trả về số user đã xóa"""
+        cleared = 0
+        while True:
+            with self.connection('clear_demo_hashes') as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE users SET password_md5 = NULL, password_sha256 = NULL
+                    WHERE id IN (
+                        SELECT id FROM users
+                        WHERE password_md5 IS NOT NULL OR password_sha256 IS NOT NULL
+                        LIMIT ?
+                    )
+                ''', (batch_size,))
+                count = cursor.rowcount
+            cleared += count
+            if count < batch_size:
+                self._user_changed(None)
+                return cleared
+    
+    def update_password_hash(self, user_id, password_hash, old_password_hash):
+        """Thay hash bcrypt nếu mật khẩu chưa bị đổi trong lúc băm lại"""
+        with self.connection('update_password_hash') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE users SET password_hash = ?
+                WHERE id = ? AND password_hash = ?
+            ''', (password_hash, user_id, old_password_hash))
+            updated = cursor.rowcount == 1
+        self._user_changed(user_id)
+        return updated
+    
+    def enqueue_email(self, kind, recipient, payload, ttl_seconds=None):
+        """Thêm email vào outbox, trả về id"""
+        expires = f'+{int(ttl_seconds)} seconds' if ttl_seconds else None
+        with self.connection('enqueue_email') as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO email_outbox (kind, recipient, payload, expires_at)
+                VALUES (?, ?, ?, CASE WHEN ? IS NULL THEN NULL ELSE datetime('now', ?) END)
+            ''', (kind, recipient, payload, expires, expires))
+            return cursor.lastrowid
+    
+    def claim_emails(self, limit=1, lease_seconds=300):
+        """Lấy tối đa `limit` email đến hạn gửi và đánh dấu đang gửi (atomic giữa các worker)
+        Email 'sending' quá lease_seconds (worker bị dừng giữa chừng) được lấy lại"""
+        with self.connection('claim_emails') as conn:
+            cursor = conn.cursor()
+            self._release_expired_leases(cursor, lease_seconds)
+            # Email OTP quá hạn thì không gửi nữa
+            cursor.execute('''
+                UPDATE email_outbox SET status = 'expired', payload = NULL
+                WHERE status = 'pending' AND expires_at <= CURRENT_TIMESTAMP
+            ''')
+            cursor.execute('''
+                UPDATE email_outbox
+                SET status = 'sending', attempts = attempts + 1, claimed_at = CURRENT_TIMESTAMP
+                WHERE id IN (
+                    SELECT id FROM email_outbox
+                    WHERE status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+                    ORDER BY next_attempt_at, id LIMIT ?
+                )
+                RETURNING *
+            ''', (limit,))
+            rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+    
+    def _release_expired_leases(self, cursor, lease_seconds):
+        """Trả email 'sending' đã quá hạn lease về hàng đợi, trả về số email"""
         cursor.execute('''
-            UPDATE users 
-            SET password_hash = ?, password_md5 = ?, password_sha256 = ?
-            WHERE id = ?
-        ''', (password_hash, password_md5, password_sha256, user_id))
-        conn.commit()
+            UPDATE email_outbox SET status = 'pending'
+            WHERE status = 'sending'
+            AND (claimed_at IS NULL OR claimed_at <= datetime('now', ?))
+        ''', (f'-{float(lease_seconds)} seconds',))
+        return cursor.rowcount
+    
+    def mark_email_sent(self, email_id):
+        """Đánh dấu đã gửi và xóa nội dung (có chứa OTP)"""
+        with self.connection('mark_email_sent') as conn:
+            conn.execute('''
+                UPDATE email_outbox
+                SET status = 'sent', payload = NULL, last_error = NULL, sent_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (email_id,))
+    
+    def mark_email_retry(self, email_id, error, delay_seconds):
+        """Đưa email về hàng đợi để thử lại sau delay_seconds"""
+        with self.connection('mark_email_retry') as conn:
+            conn.execute('''
+                UPDATE email_outbox
+                SET status = 'pending', last_error = ?, next_attempt_at = datetime('now', ?)
+                WHERE id = ?
+            ''', (error, f'+{float(delay_seconds)} seconds', email_id))
+    
+    def mark_email_failed(self, email_id, error):
+        """Đánh dấu gửi thất bại sau khi hết số lần thử"""
+        with self.connection('mark_email_failed') as conn:
+            conn.execute('''
+                UPDATE email_outbox SET status = 'failed', payload = NULL, last_error = ?
+                WHERE id = ?
+            ''', (error, email_id))
+    
+    def reset_stuck_emails(self, lease_seconds=300):
+        """Trả các email gửi dở (process bị dừng) về hàng đợi; email worker khác
+        vừa nhận (còn trong lease) thì giữ nguyên để không gửi trùng"""
+        with self.connection('reset_stuck_emails') as conn:
+            return self._release_expired_leases(conn.cursor(), lease_seconds)
+    
+    def email_outbox_stats(self):
+        """Số email theo trạng thái"""
+        with self.read_connection('email_outbox_stats') as conn:
+            rows = conn.execute(
+                'SELECT status, COUNT(*) FROM email_outbox GROUP BY status'
+            ).fetchall()
+        return {row[0]: row[1] for row in rows}
+    
+    def get_session(self, session_id, now):
+        """Lấy (data, expires_at) của session còn hạn, None nếu không có"""
+        with self.read_connection('get_session') as conn:
+            row = conn.execute('''
+                SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?
+            ''', (session_id, now)).fetchone()
+        return tuple(row) if row else None
+    
+    def save_session(self, session_id, data, expires_at):
+        """Tạo hoặc ghi đè session"""
+        with self.connection('save_session') as conn:
+            conn.execute('''
+                INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at
+            ''', (session_id, data, expires_at))
+    
+    def touch_session(self, session_id, expires_at):
+        """Gia hạn session mà không ghi lại dữ liệu"""
+        with self.connection('touch_session') as conn:
+            conn.execute('UPDATE sessions SET expires_at = ? WHERE id = ?', (expires_at, session_id))
+    
+    def delete_session(self, session_id):
+        """Xóa session (đăng xuất hoặc đổi session id)"""
+        with self.connection('delete_session') as conn:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+    
+    def purge_email_outbox(self, older_than_days=7, batch_size=1000):
+        """Xóa email đã xử lý xong cũ hơn older_than_days, trả về số dòng đã xóa"""
+        cutoff = f'-{int(older_than_days)} days'
+        deleted = 0
+        while True:
+            with self.connection('purge_email_outbox') as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM email_outbox WHERE id IN (
+                        SELECT id FROM email_outbox
+                        WHERE status IN ('sent', 'failed', 'expired')
+                        AND created_at < datetime('now', ?)
+                        LIMIT ?
+                    )
+                ''', (cutoff, batch_size))
+                count = cursor.rowcount
+            deleted += count
+            if count < batch_size:
+                return deleted
+    
+    def purge_otps(self, batch_size=1000):
+        """Xóa OTP đã dùng hoặc hết hạn theo từng lô, trả về số dòng đã xóa"""
+        deleted = 0
+        while True:
+            # Mỗi lô là một transaction ngắn để không giữ khóa ghi lâu
+            with self.connection('purge_otps') as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM otp_codes WHERE id IN (
+                        SELECT id FROM otp_codes
+                        WHERE is_used = 1 OR expires_at <= CURRENT_TIMESTAMP
+                        LIMIT ?
+                    )
+                ''', (batch_size,))
+                count = cursor.rowcount
+            deleted += count
+            if count < batch_size:
+                return deleted
+    
+    def purge_sessions(self, now, batch_size=1000):
+        """Xóa session hết hạn theo từng lô qua index expires_at, trả về số dòng đã xóa"""
+        deleted = 0
+        while True:
+            with self.connection('purge_sessions') as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM sessions WHERE id IN (
+                        SELECT id FROM sessions WHERE expires_at <= ? LIMIT ?
+                    )
+                ''', (now, batch_size))
+                count = cursor.rowcount
+            deleted += count
+            if count < batch_size:
+                return deleted
+    
+    def rollup_login_history(self, older_than_days=90, batch_size=1000):
+        """Gộp lịch sử đăng nhập cũ vào login_history_daily rồi xóa, trả về số dòng đã gộp.
+        Các lần thử bằng email không tồn tại được gộp vào user_id 0"""
+        cutoff = f'-{int(older_than_days)} days'
+        archived = 0
+        while True:
+            with self.connection('rollup_login_history') as conn:
+                cursor = conn.cursor()
+                # Cùng một transaction nên hai câu lệnh thấy cùng một lô
+                cursor.execute('''
+                    INSERT INTO login_history_daily (user_id, day, status, attempts)
+                    SELECT COALESCE(user_id, 0), date(login_time), COALESCE(status, ''), COUNT(*)
+                    FROM login_history
+                    WHERE id IN (
+                        SELECT id FROM login_history
+                        WHERE login_time < datetime('now', ?)
+                        ORDER BY id LIMIT ?
+                    )
+                    GROUP BY COALESCE(user_id, 0), date(login_time), COALESCE(status, '')
+                    ON CONFLICT (user_id, day, status)
+                    DO UPDATE SET attempts = attempts + excluded.attempts
+                ''', (cutoff, batch_size))
+                cursor.execute('''
+                    DELETE FROM login_history WHERE id IN (
+                        SELECT id FROM login_history
+                        WHERE login_time < datetime('now', ?)
+                        ORDER BY id LIMIT ?
+                    )
+                ''', (cutoff, batch_size))
+                count = cursor.rowcount
+            archived += count
+            if count < batch_size:
+                return archived
+    
+    def incremental_vacuum(self, max_pages=None):
+        """Trả các trang trống về hệ điều hành, trả về số trang đã giải phóng"""
+        with self.connection('incremental_vacuum') as conn:
+            before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if max_pages:
+                conn.execute(f'PRAGMA incremental_vacuum({int(max_pages)})').fetchall()
+            else:
+                conn.execute('PRAGMA incremental_vacuum').fetchall()
+            after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return before - after
     
     def close(self):
-        """Đóng kết nối database"""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
+        """Đóng các pool kết nối database"""
+        if self.read_pool:
+            self.read_pool.close()
+            self.read_pool = None
+        if self.pool:
+            self.pool.close()
+            self.pool = None
@@ -0,0 +1,128 @@
+"""
+Email Queue
+Hàng đợi email bền vững (bảng email_outbox) với worker gửi nền,
+thử lại với backoff và ghi nhận trạng thái gửi
+"""
+import json
+import os
+import threading
+
+
+class EmailQueue:
+    def __init__(self, database, email_service, workers=None, max_attempts=None,
+                 backoff_base=None, poll_interval=None, batch_size=None):
+        self.db = database
+        self.email_service = email_service
+        self.workers = workers if workers is not None else int(os.getenv('EMAIL_WORKERS', '2'))
+        self.max_attempts = max_attempts or int(os.getenv('EMAIL_MAX_ATTEMPTS', '5'))
+        self.backoff_base = backoff_base or float(os.getenv('EMAIL_BACKOFF_BASE', '2'))
+        self.poll_interval = poll_interval or float(os.getenv('EMAIL_POLL_INTERVAL', '1'))
+        # Số email mỗi worker gửi liên tiếp trên một phiên SMTP
+        self.batch_size = batch_size or int(os.getenv('EMAIL_BATCH_SIZE', '20'))
+        # Email đang gửi quá số giây này mới được coi là bị bỏ dở (phải lớn hơn thời gian gửi một lô)
+        self.lease_seconds = float(os.getenv('EMAIL_LEASE_SECONDS', '300'))
+        self._wakeup = threading.Condition()
+        self._pending_signal = False
+        self._stop = threading.Event()
+        self._threads = []
+    
+    def enqueue_otp(self, recipient_email, username, otp_code, ttl_seconds=300):
+        """Đưa email OTP vào hàng đợi, trả về True nếu đã lưu"""
+        try:
+            payload = json.dumps({'username': username, 'otp_code': otp_code})
+            self.db.enqueue_email('otp', recipient_email, payload, ttl_seconds)
+        except Exception as e:
+            print(f"❌ Lỗi đưa email vào hàng đợi: {str(e)}")
+            return False
+        
+        if self.workers <= 0:
+            # Không có worker: gửi ngay trên thread gọi
+            self.drain()
+        else:
+            self._notify()
+        return True
+    
+    def _notify(self):
+        """Đánh thức worker đang chờ"""
+        with self._wakeup:
+            self._pending_signal = True
+            self._wakeup.notify()
+    
+    def process_batch(self):
+        """Gửi một lô email đến hạn qua cùng phiên SMTP, trả về số email đã xử lý"""
+        emails = self.db.claim_emails(self.batch_size, self.lease_seconds)
+        if not emails:
+            return 0
+        
+        otp_emails = [email for email in emails if email['kind'] == 'otp']
+        errors = {email['id']: f"unknown kind {email['kind']}"
+                  for email in emails if email['kind'] != 'otp'}
+        try:
+            items = []
+            for email in otp_emails:
+                payload = json.loads(email['payload'])
+                items.append((email['recipient'], payload['username'], payload['otp_code']))
+            results = self.email_service.send_otp_batch(items)
+        except Exception as e:
+            results = [str(e)] * len(otp_emails)
+        for email, error in zip(otp_emails, results):
+            errors[email['id']] = error
+        
+        for email in emails:
+            error = errors[email['id']]
+            if error is None:
+                self.db.mark_email_sent(email['id'])
+            elif email['attempts'] >= self.max_attempts:
+                self.db.mark_email_failed(email['id'], error)
+            else:
+                # Backoff lũy thừa: 2s, 4s, 8s, ...
+                self.db.mark_email_retry(email['id'], error, self.backoff_base ** email['attempts'])
+        return len(emails)
+    
+    def drain(self):
+        """Gửi hết các email đến hạn, trả về số email đã xử lý"""
+        processed = 0
+        while True:
+            count = self.process_batch()
+            if not count:
+                return processed
+            processed += count
+    
+    def _worker(self):
+        """Vòng lặp của worker gửi email"""
+        while not self._stop.is_set():
+            try:
+                if self.process_batch():
+                    continue
+            except Exception as e:
+                print(f"❌ Lỗi worker email: {str(e)}")
+            
+            # Hàng đợi trống: chờ email mới hoặc tới lượt thử lại
+            with self._wakeup:
+                if not self._pending_signal:
+                    self._wakeup.wait(self.poll_interval)
+                self._pending_signal = False
+    
+    def start(self):
+        """Khởi động các worker, gửi tiếp email còn dở từ lần chạy trước"""
+        if self._threads or self.workers <= 0:
+            return
+        self.db.reset_stuck_emails(self.lease_seconds)
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'email-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self, timeout=None):
+        """Dừng các worker"""
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+    
+    def stats(self):
+        """Số email theo trạng thái giao"""
+        return self.db.email_outbox_stats()
@@ -2,11 +2,12 @@
 Email Service
 Gửi OTP qua email
 """
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import os
 
+from email_templates import OTPEmailTemplate
+from metrics import AUTH_STAGE_SECONDS
+from smtp_pool import SMTPConnectionPool, RawMessage
+
 class EmailService:
     def __init__(self):
         # Cấu hình email - Thay đổi thông tin này
@@ -15,140 +16,70 @@ class EmailService:
         self.sender_email = os.getenv('SENDER_EMAIL', 'your-email@gmail.com')
         self.sender_password = os.getenv('SENDER_PASSWORD', 'your-app-password')
         self.sender_name = 'Secure Auth System'
+        # SMTP_ENABLED=1 để gửi thật, mặc định chỉ in ra console (demo)
+        self.smtp_enabled = os.getenv('SMTP_ENABLED', '0') == '1'
+        self.smtp_use_tls = os.getenv('SMTP_USE_TLS', '1') == '1'
+        self.smtp_timeout = float(os.getenv('SMTP_TIMEOUT', '10'))
+        self._smtp_pool = None
+        # Template email OTP biên dịch một lần
+        self.otp_template = OTPEmailTemplate(self.sender_name, self.sender_email)
+    
+    @property
+    def smtp_pool(self):
+        """Pool phiên SMTP đã xác thực, tạo khi gửi lần đầu"""
+        if self._smtp_pool is None:
+            self._smtp_pool = SMTPConnectionPool(
+                self.smtp_server, self.smtp_port,
+                username=self.sender_email, password=self.sender_password,
+                use_tls=self.smtp_use_tls, timeout=self.smtp_timeout
+            )
+        return self._smtp_pool
+    
+    def build_otp_message(self, recipient_email, username, otp_code):
+        """Tạo email OTP từ template đã biên dịch sẵn"""
+        data = self.otp_template.build(recipient_email, username, otp_code)
+        return RawMessage(self.sender_email, [recipient_email], data)
     
     def send_otp_email(self, recipient_email, username, otp_code):
         """Gửi mã OTP qua email"""
-        try:
-            # Tạo email
-            message = MIMEMultipart('alternative')
-            message['Subject'] = f'Mã OTP đăng nhập - {otp_code}'
-            message['From'] = f'{self.sender_name} <{self.sender_email}>'
-            message['To'] = recipient_email
-            
-            # Nội dung email HTML
-            html_content = f'''
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    body {{
-                        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                        background-color: #f4f4f4;
-                        margin: 0;
-                        padding: 0;
-                    }}
-                    .container {{
-                        max-width: 600px;
-                        margin: 40px auto;
-                        background-color: #ffffff;
-                        border-radius: 10px;
-                        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-                        overflow: hidden;
-                    }}
-                    .header {{
-                        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                        color: white;
-                        padding: 30px;
-                        text-align: center;
-                    }}
-                    .header h1 {{
-                        margin: 0;
-                        font-size: 24px;
-                    }}
-                    .content {{
-                        padding: 40px 30px;
-                    }}
-                    .otp-box {{
-                        background-color: #f8f9fa;
-                        border: 2px dashed #667eea;
-                        border-radius: 8px;
-                        padding: 20px;
-                        text-align: center;
-                        margin: 30px 0;
-                    }}
-                    .otp-code {{
-                        font-size: 36px;
-                        font-weight: bold;
-                        color: #667eea;
-                        letter-spacing: 8px;
-                        margin: 10px 0;
-                    }}
-                    .warning {{
-                        background-color: #fff3cd;
-                        border-left: 4px solid #ffc107;
-                        padding: 15px;
-                        margin: 20px 0;
-                        border-radius: 4px;
-                    }}
-                    .footer {{
-                        background-color: #f8f9fa;
-                        padding: 20px;
-                        text-align: center;
-                        color: #6c757d;
-                        font-size: 14px;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>🔐 Xác Thực Đăng Nhập</h1>
-                    </div>
-                    <div class="content">
-                        <p>Xin chào <strong>{username}</strong>,</p>
-                        <p>Bạn đã yêu cầu đăng nhập vào hệ thống. Đây là mã OTP của bạn:</p>
-                        
-                        <div class="otp-box">
-                            <p style="margin: 0; color: #6c757d;">Mã OTP của bạn</p>
-                            <div class="otp-code">{otp_code}</div>
-                            <p style="margin: 0; color: #6c757d; font-size: 14px;">Có hiệu lực trong 5 phút</p>
-                        </div>
-                        
-                        <div class="warning">
-                            <strong>⚠️ Lưu ý bảo mật:</strong>
-                            <ul style="margin: 10px 0 0 0; padding-left: 20px;">
-                                <li>Không chia sẻ mã này với bất kỳ ai</li>
-                                <li>Mã OTP chỉ có hiệu lực trong 5 phút</li>
-                                <li>Nếu bạn không yêu cầu đăng nhập, vui lòng bỏ qua email này</li>
-                            </ul>
-                        </div>
-                        
-                        <p style="margin-top: 30px;">Trân trọng,<br><strong>Secure Auth System</strong></p>
-                    </div>
-                    <div class="footer">
-                        <p>Email này được gửi tự động, vui lòng không trả lời.</p>
-                        <p>© 2025 Secure Auth System. All rights reserved.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            '''
-            
-            # Attach HTML content
-            html_part = MIMEText(html_content, 'html')
-            message.attach(html_part)
-            
-            # Gửi email
+        return self.send_otp_batch([(recipient_email, username, otp_code)])[0] is None
+    
+    def send_otp_batch(self, items):
+        """Gửi nhiều email OTP [(email, username, otp)] qua cùng một phiên SMTP,
+        trả về danh sách lỗi tương ứng (None nếu gửi thành công)"""
+        errors = [None] * len(items)
+        messages = []
+        for i, (recipient_email, username, otp_code) in enumerate(items):
+            try:
+                messages.append((i, self.build_otp_message(recipient_email, username, otp_code)))
+            except Exception as e:
+                errors[i] = str(e)
+        
+        if self.smtp_enabled:
+            with AUTH_STAGE_SECONDS.time(stage='email_send'):
+                results = self.smtp_pool.send_many([message for _, message in messages])
+            for (i, _), error in zip(messages, results):
+                errors[i] = error
+        else:
             # Chế độ demo: In ra console thay vì gửi thật
-            print(f"\n{'='*60}")
-            print(f"📧 EMAIL OTP (DEMO MODE)")
-            print(f"{'='*60}")
-            print(f"To: {recipient_email}")
-            print(f"Subject: Mã OTP đăng nhập - {otp_code}")
-            print(f"OTP Code: {otp_code}")
-            print(f"{'='*60}\n")
-            
-            # Uncomment để gửi email thật
-            # with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-            #     server.starttls()
-            #     server.login(self.sender_email, self.sender_password)
-            #     server.send_message(message)
-            
-            return True
-            
-        except Exception as e:
-            print(f"❌ Lỗi gửi email: {str(e)}")
-            return False
+            for i, _ in messages:
+                recipient_email, _, otp_code = items[i]
+                print(f"\n{'='*60}")
+                print(f"📧 EMAIL OTP (DEMO MODE)")
+                print(f"{'='*60}")
+                print(f"To: {recipient_email}")
+                print(f"Subject: Mã OTP đăng nhập - {otp_code}")
+                print(f"OTP Code: {otp_code}")
+                print(f"{'='*60}\n")
+        
+        for error in errors:
+            if error is not None:
+                print(f"❌ Lỗi gửi email: {error}")
+        return errors
+    
+    def deliver(self, message):
+        """Gửi message qua phiên SMTP trong pool, lỗi được ném ra cho nơi gọi xử lý"""
+        self.smtp_pool.send(message)
     
     def send_welcome_email(self, recipient_email, username):
         """Gửi email chào mừng khi đăng ký"""
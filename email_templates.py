@@ -0,0 +1,105 @@
+"""
+Email Templates
+Biên dịch template email một lần khi khởi động: phần tĩnh và header MIME
+được mã hóa sẵn thành bytes, mỗi email chỉ còn điền username và OTP
+"""
+import base64
+import html
+import os
+import random
+import re
+from email.header import Header
+from email.utils import formataddr
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'email')
+
+_PLACEHOLDER = re.compile(r'\$\{(\w+)\}')
+
+
+class CompiledTemplate:
+    """Template dạng ${name}, tách sẵn thành các đoạn bytes tĩnh"""
+
+    def __init__(self, source, escape=None):
+        parts = _PLACEHOLDER.split(source)
+        self._static = [part.encode('utf-8') for part in parts[0::2]]
+        self._fields = parts[1::2]
+        self._escape = escape
+
+    @classmethod
+    def from_file(cls, path, escape=None):
+        with open(path, encoding='utf-8') as f:
+            return cls(f.read(), escape)
+
+    def render(self, **values):
+        """Ghép các đoạn tĩnh với giá trị, trả về bytes UTF-8"""
+        escape = self._escape
+        out = [self._static[0]]
+        for field, static in zip(self._fields, self._static[1:]):
+            value = str(values[field])
+            if escape:
+                value = escape(value)
+            out.append(value.encode('utf-8'))
+            out.append(static)
+        return b''.join(out)
+
+
+def _encode_body(data):
+    """Base64 theo dòng 76 ký tự, kết thúc dòng CRLF như MIMEText"""
+    return base64.encodebytes(data).replace(b'\n', b'\r\n')
+
+
+def _header_value(value):
+    """Giá trị header ASCII giữ nguyên, ngược lại mã hóa RFC 2047"""
+    if '\r' in value or '\n' in value:
+        raise ValueError('Header không được chứa ký tự xuống dòng')
+    return value if value.isascii() else Header(value, 'utf-8').encode()
+
+
+class OTPEmailTemplate:
+    """Email OTP multipart/alternative (text + HTML) dựng sẵn ở mức bytes"""
+
+    def __init__(self, sender_name, sender_email, template_dir=TEMPLATE_DIR):
+        self.sender_email = sender_email
+        self.html = CompiledTemplate.from_file(os.path.join(template_dir, 'otp.html'), html.escape)
+        self.text = CompiledTemplate.from_file(os.path.join(template_dir, 'otp.txt'))
+
+        # Boundary cố định cho cả process; thân email là base64 nên không thể trùng
+        boundary = '===============%019d==' % random.randrange(10 ** 19)
+        # Tiêu đề "Mã OTP đăng nhập - 123456": phần tiếng Việt mã hóa một lần, OTP là ASCII
+        subject_prefix = Header('Mã OTP đăng nhập -', 'utf-8').encode()
+
+        self._head = (
+            f'Content-Type: multipart/alternative; boundary="{boundary}"\r\n'
+            f'MIME-Version: 1.0\r\n'
+            f'From: {formataddr((sender_name, sender_email))}\r\n'
+            f'Subject: {subject_prefix} '
+        ).encode('ascii')
+        self._to = b'\r\nTo: '
+        self._text_part = (
+            f'\r\n\r\n--{boundary}\r\n'
+            f'Content-Type: text/plain; charset="utf-8"\r\n'
+            f'MIME-Version: 1.0\r\n'
+            f'Content-Transfer-Encoding: base64\r\n\r\n'
+        ).encode('ascii')
+        self._html_part = (
+            f'\r\n--{boundary}\r\n'
+            f'Content-Type: text/html; charset="utf-8"\r\n'
+            f'MIME-Version: 1.0\r\n'
+            f'Content-Transfer-Encoding: base64\r\n\r\n'
+        ).encode('ascii')
+        self._tail = f'\r\n--{boundary}--\r\n'.encode('ascii')
+
+    def build(self, recipient_email, username, otp_code):
+        """Trả về nội dung email hoàn chỉnh (bytes, CRLF) sẵn sàng cho SMTP DATA"""
+        otp_code = str(otp_code)
+        # OTP nằm thẳng trong header Subject: chỉ nhận ASCII in được (chặn CR/LF, ký tự điều khiển),
+        # mọi OTP_ALPHABET hợp lệ đều thỏa; phần HTML đã được escape khi render
+        if not otp_code or not otp_code.isascii() or not otp_code.isprintable():
+            raise ValueError('Mã OTP không hợp lệ')
+        return b''.join((
+            self._head, otp_code.encode('ascii'),
+            self._to, _header_value(recipient_email).encode('ascii'),
+            self._text_part, _encode_body(self.text.render(username=username, otp_code=otp_code)),
+            self._html_part, _encode_body(self.html.render(username=username, otp_code=otp_code)),
+            self._tail,
+        ))
@@ -0,0 +1,176 @@
+"""
+Hashing Executor
+Chạy bcrypt trong process pool để không chặn các worker web,
+giới hạn hàng đợi và từ chối ngay khi quá tải
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import hash_password_bcrypt, verify_password
+
+# Không thấp hơn cost 12 của các hash đã có, tránh hạ cấp khi máy chậm
+MIN_BCRYPT_COST = 12
+MAX_BCRYPT_COST = 16
+
+
+class HashingBusyError(Exception):
+    """Hàng đợi băm mật khẩu đã đầy"""
+    pass
+
+
+class HashingTimeoutError(Exception):
+    """Băm mật khẩu vượt quá thời gian cho phép"""
+    pass
+
+
+def calibrate_bcrypt_cost(target_ms, min_cost=MIN_BCRYPT_COST, max_cost=MAX_BCRYPT_COST):
+    """Chọn cost bcrypt lớn nhất mà một lần băm không vượt quá target_ms trên máy này"""
+    # Mỗi lần tăng cost thời gian băm tăng gấp đôi, nên chỉ cần đo một lần ở cost nhỏ nhất
+    hash_password_bcrypt('calibration', min_cost)
+    start = time.perf_counter()
+    hash_password_bcrypt('calibration', min_cost)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    cost = min_cost
+    while cost < max_cost and elapsed_ms * 2 <= target_ms:
+        cost += 1
+        elapsed_ms *= 2
+    return cost
+
+
+def resolve_bcrypt_cost():
+    """Cost bcrypt: BCRYPT_COST nếu đã đặt, nếu không thì đo theo BCRYPT_TARGET_MS"""
+    if os.getenv('BCRYPT_COST'):
+        return int(os.getenv('BCRYPT_COST'))
+    return calibrate_bcrypt_cost(float(os.getenv('BCRYPT_TARGET_MS', '250')))
+
+
+def pool_context():
+    """Context tạo process con cho pool băm mật khẩu. Process cha có nhiều thread, kết nối
+    SQLite và lock: fork có thể chép cả lock đang bị giữ sang process con"""
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+class HashingExecutor:
+    def __init__(self, workers=None, max_queue=None, timeout=None, rounds=None):
+        # workers = 0: băm ngay trên thread gọi (dùng khi dev/test)
+        self.workers = workers if workers is not None else int(os.getenv('HASH_WORKERS', str(os.cpu_count() or 1)))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv('HASH_MAX_QUEUE', str(self.workers * 4)))
+        self.timeout = timeout or float(os.getenv('HASH_TIMEOUT', '5'))
+        # Cost bcrypt: cố định qua BCRYPT_COST hoặc đo theo BCRYPT_TARGET_MS khi khởi động
+        self.rounds = rounds or resolve_bcrypt_cost()
+        # Băm trên thread gọi thì không có hàng đợi để giới hạn
+        self._slots = (threading.BoundedSemaphore(max(1, self.workers + self.max_queue))
+                       if self.workers > 0 else None)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'rejected': 0,
+            'timeouts': 0,
+            'latency_total': 0.0,
+            'latency_max': 0.0,
+        }
+    
+    def _get_pool(self):
+        """Tạo process pool khi cần"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context())
+        return self._pool
+    
+    def _reset_pool(self, pool):
+        """Bỏ pool đã hỏng (process con bị chết) để lần gọi sau tạo pool mới"""
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    def _record(self, latency):
+        """Ghi nhận một lần băm hoàn tất"""
+        with self._lock:
+            self._in_flight -= 1
+            self._stats['completed'] += 1
+            self._stats['latency_total'] += latency
+            self._stats['latency_max'] = max(self._stats['latency_max'], latency)
+    
+    def _run(self, fn, *args):
+        """Chạy fn trong pool, từ chối ngay nếu đã đủ số việc đang chờ"""
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HashingBusyError('Hệ thống đang bận, vui lòng thử lại sau')
+        
+        start = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+            self._stats['submitted'] += 1
+        
+        if self.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                self._record(time.perf_counter() - start)
+        
+        def done(_):
+            self._record(time.perf_counter() - start)
+            self._slots.release()
+        
+        pool = self._get_pool()
+        try:
+            future = pool.submit(fn, *args)
+        except BaseException as e:
+            # Chưa gửi được việc nào: trả slot ngay
+            done(None)
+            if isinstance(e, BrokenProcessPool):
+                self._reset_pool(pool)
+                raise HashingBusyError('Hệ thống đang bận, vui lòng thử lại sau') from e
+            raise
+        future.add_done_callback(done)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Việc còn trong hàng đợi thì hủy; việc đang chạy vẫn giữ slot tới khi xong
+            future.cancel()
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise HashingTimeoutError('Băm mật khẩu quá thời gian cho phép')
+        except BrokenProcessPool as e:
+            self._reset_pool(pool)
+            raise HashingBusyError('Hệ thống đang bận, vui lòng thử lại sau') from e
+    
+    def hash_password(self, password):
+        """Băm mật khẩu bcrypt trong process pool"""
+        return self._run(hash_password_bcrypt, password, self.rounds)
+    
+    def verify_password(self, password, hashed_password):
+        """Kiểm tra mật khẩu bcrypt trong process pool"""
+        return self._run(verify_password, password, hashed_password)
+    
+    def stats(self):
+        """Thống kê: độ sâu hàng đợi, số việc bị từ chối và độ trễ băm"""
+        with self._lock:
+            stats = dict(self._stats)
+            in_flight = self._in_flight
+        stats['in_flight'] = in_flight
+        stats['queue_depth'] = max(0, in_flight - max(self.workers, 1))
+        stats['workers'] = self.workers
+        stats['max_queue'] = self.max_queue
+        stats['rounds'] = self.rounds
+        stats['latency_avg'] = stats['latency_total'] / (stats['completed'] or 1)
+        return stats
+    
+    def shutdown(self, wait=True):
+        """Dừng process pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,80 @@
+"""
+Maintenance Job
+Job chạy nền dọn OTP hết hạn/đã dùng, gộp lịch sử đăng nhập cũ,
+dọn session hết hạn, email outbox đã xử lý và vacuum dần
+"""
+import os
+import threading
+import time
+
+
+class MaintenanceJob:
+    def __init__(self, database, interval=None, batch_size=None, history_retention_days=None,
+                 vacuum_pages=None):
+        self.db = database
+        self.interval = interval or float(os.getenv('MAINTENANCE_INTERVAL', '3600'))
+        self.batch_size = batch_size or int(os.getenv('MAINTENANCE_BATCH_SIZE', '1000'))
+        self.history_retention_days = (history_retention_days
+                                       or int(os.getenv('LOGIN_HISTORY_RETENTION_DAYS', '90')))
+        self.vacuum_pages = vacuum_pages or int(os.getenv('MAINTENANCE_VACUUM_PAGES', '2000'))
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def run_once(self):
+        """Chạy một lượt dọn dẹp, trả về báo cáo số dòng thu hồi và thời gian"""
+        start = time.perf_counter()
+        report = {}
+        
+        step = time.perf_counter()
+        report['otp_deleted'] = self.db.purge_otps(self.batch_size)
+        report['otp_seconds'] = time.perf_counter() - step
+        
+        step = time.perf_counter()
+        report['history_archived'] = self.db.rollup_login_history(
+            self.history_retention_days, self.batch_size
+        )
+        report['history_seconds'] = time.perf_counter() - step
+        
+        step = time.perf_counter()
+        report['sessions_deleted'] = self.db.purge_sessions(int(time.time()), self.batch_size)
+        report['session_seconds'] = time.perf_counter() - step
+        
+        step = time.perf_counter()
+        report['emails_deleted'] = self.db.purge_email_outbox(batch_size=self.batch_size)
+        report['email_seconds'] = time.perf_counter() - step
+        
+        step = time.perf_counter()
+        report['pages_freed'] = self.db.incremental_vacuum(self.vacuum_pages)
+        report['vacuum_seconds'] = time.perf_counter() - step
+        
+        report['elapsed'] = time.perf_counter() - start
+        self.last_report = report
+        return report
+    
+    def _loop(self):
+        """Vòng lặp của thread nền"""
+        while not self._stop.wait(self.interval):
+            try:
+                report = self.run_once()
+                print(f"🧹 Maintenance: {report['otp_deleted']} OTP, "
+                      f"{report['history_archived']} login history, "
+                      f"{report['sessions_deleted']} sessions, "
+                      f"{report['emails_deleted']} emails, "
+                      f"{report['pages_freed']} pages in {report['elapsed']:.2f}s")
+            except Exception as e:
+                print(f"❌ Lỗi maintenance: {str(e)}")
+    
+    def start(self):
+        """Khởi động job chạy nền"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='maintenance', daemon=True)
+            self._thread.start()
+    
+    def stop(self, timeout=None):
+        """Dừng job chạy nền"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
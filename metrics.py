@@ -0,0 +1,243 @@
+"""
+Metrics
+Counter và histogram dạng Prometheus, xuất qua /metrics
+Mỗi thread ghi vào bộ đếm riêng (không khóa), chỉ gộp lại khi render;
+bộ đếm của thread đã kết thúc được gộp vào bộ đếm chung rồi bỏ đi
+METRICS_ENABLED=0 để tắt hoàn toàn
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _merge(target, store):
+    """Cộng dồn một bộ đếm vào target"""
+    # list() chụp dict trong một bước; thread chủ vẫn ghi tiếp được
+    for key, cell in list(store.items()):
+        total = target.get(key)
+        if total is None:
+            target[key] = list(cell)
+        else:
+            for i, value in enumerate(cell):
+                total[i] += value
+
+
+class _Timer:
+    __slots__ = ('histogram', 'key', 'start')
+
+    def __init__(self, histogram, key):
+        self.histogram = histogram
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram._observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, registry, name, help):
+        self.registry = registry
+        self.name = name
+        self.help = help
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        store = self.registry._store()
+        key = (self.name, _label_key(labels))
+        cell = store.get(key)
+        if cell is None:
+            cell = store[key] = [0]
+        cell[0] += amount
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help, buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if self.registry.enabled:
+            self._observe((self.name, _label_key(labels)), value)
+
+    def time(self, **labels):
+        """Context manager đo thời gian khối lệnh (giây)"""
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, (self.name, _label_key(labels)))
+
+    def _observe(self, key, value):
+        store = self.registry._store()
+        cell = store.get(key)
+        if cell is None:
+            # [số mẫu theo từng bucket..., +Inf, tổng]
+            cell = store[key] = [0] * (len(self.buckets) + 2)
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+
+class Registry:
+    def __init__(self, enabled=None):
+        self.enabled = enabled if enabled is not None else os.getenv('METRICS_ENABLED', '1') == '1'
+        self._metrics = {}
+        self._collectors = []
+        # [(thread, bộ đếm)] của các thread đang ghi; _base giữ số liệu của thread đã kết thúc
+        self._stores = []
+        self._base = {}
+        self._sweep_at = 32
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _store(self):
+        """Bộ đếm riêng của thread hiện tại, đăng ký với registry ở lần dùng đầu"""
+        try:
+            return self._local.store
+        except AttributeError:
+            store = self._local.store = {}
+            with self._lock:
+                self._stores.append((threading.current_thread(), store))
+                # Server tạo thread mới cho mỗi request: dọn định kỳ để danh sách không phình mãi
+                if len(self._stores) >= self._sweep_at:
+                    self._sweep()
+                    self._sweep_at = max(32, len(self._stores) * 2)
+            return store
+
+    def _sweep(self):
+        """Gộp bộ đếm của các thread đã kết thúc vào _base và bỏ chúng (phải giữ lock)"""
+        alive = []
+        for thread, store in self._stores:
+            if thread.is_alive():
+                alive.append((thread, store))
+            else:
+                _merge(self._base, store)
+        self._stores = alive
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help):
+        return self._register(Counter(self, name, help))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, help, buckets))
+
+    def add_collector(self, collect):
+        """collect() trả về [(tên, {label: giá trị}, giá trị)], xuất dạng gauge khi render"""
+        self._collectors.append(collect)
+
+    def snapshot(self):
+        """Gộp bộ đếm của mọi thread: {(tên, labels): [giá trị...]}"""
+        with self._lock:
+            self._sweep()
+            merged = {key: list(cell) for key, cell in self._base.items()}
+            stores = [store for _, store in self._stores]
+        for store in stores:
+            _merge(merged, store)
+        return merged
+
+    def render(self):
+        """Xuất toàn bộ metrics theo định dạng text của Prometheus"""
+        series = {}
+        for (name, labels), cell in self.snapshot().items():
+            series.setdefault(name, []).append((labels, cell))
+
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for labels, cell in sorted(series.get(name, ())):
+                if metric.kind == 'counter':
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(cell[0])}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + ('+Inf',), cell[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _format_value(float(bound))
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(cell[-1])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+
+        gauges = {}
+        for collect in self._collectors:
+            try:
+                for name, labels, value in collect():
+                    gauges.setdefault(name, []).append((_label_key(labels), value))
+            except Exception as e:
+                print(f"❌ Lỗi thu thập metrics: {str(e)}")
+        for name, samples in sorted(gauges.items()):
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in sorted(samples):
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# Registry dùng chung trong process (mỗi worker có bộ đếm riêng)
+metrics = Registry()
+
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'http_request_duration_seconds', 'Thời gian xử lý request theo route')
+HTTP_REQUESTS = metrics.counter(
+    'http_requests_total', 'Số request theo route và mã trạng thái')
+AUTH_STAGE_SECONDS = metrics.histogram(
+    'auth_stage_duration_seconds', 'Thời gian từng bước xác thực (bcrypt, OTP, email)')
+DB_QUERY_SECONDS = metrics.histogram(
+    'db_query_duration_seconds', 'Thời gian mỗi thao tác Database (gồm chờ kết nối)')
+AUTH_ATTEMPTS = metrics.counter(
+    'auth_attempts_total', 'Kết quả authenticate_user')
+OTP_FAILURES = metrics.counter(
+    'otp_failures_total', 'Số lần xác thực OTP thất bại')
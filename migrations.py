@@ -0,0 +1,314 @@
+"""
+Database Migrations
+Các thay đổi schema có đánh số phiên bản, chạy tuần tự khi khởi động
+Phiên bản hiện tại được lưu trong PRAGMA user_version
+"""
+import sqlite3
+import time
+
+# Thời gian tối đa (giây) chờ worker khác chạy xong migration không dùng transaction
+NON_TRANSACTIONAL_TIMEOUT = 120
+
+
+def _initial_schema(cursor):
+    """Tạo các bảng users, otp_codes, login_history"""
+    # Bảng users
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            phone TEXT,
+            password_hash TEXT NOT NULL,
+            password_md5 TEXT NOT NULL,
+            password_sha256 TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1
+        )
+    ''')
+    
+    # Bảng OTP
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS otp_codes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            otp_code TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL,
+            is_used BOOLEAN DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    # Bảng login history
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS login_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ip_address TEXT,
+            user_agent TEXT,
+            status TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+
+def _lookup_indexes(cursor):
+    """Index cho tra cứu OTP và lịch sử đăng nhập theo user"""
+    # Khớp bằng trên (user_id, otp_code, is_used) rồi duyệt theo created_at giảm dần,
+    # expires_at lọc ngay trong index. Index chứa mọi cột của otp_codes (id là rowid)
+    # nên get_valid_otp không cần đọc bảng.
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_otp_codes_lookup
+        ON otp_codes (user_id, otp_code, is_used, created_at, expires_at)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_login_history_user_time
+        ON login_history (user_id, login_time)
+    ''')
+
+
+def _login_history_rollup(cursor):
+    """Bảng tổng hợp lịch sử đăng nhập theo ngày cho dữ liệu cũ đã dọn"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS login_history_daily (
+            user_id INTEGER NOT NULL,
+            day DATE NOT NULL,
+            status TEXT NOT NULL DEFAULT '',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, status)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _incremental_vacuum(cursor):
+    """Bật auto_vacuum=INCREMENTAL để job dọn dẹp trả lại dung lượng từng phần"""
+    # Chỉ có hiệu lực sau VACUUM, và VACUUM không chạy được trong transaction
+    if cursor.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+
+
+_incremental_vacuum.transactional = False
+
+
+def _optional_demo_hashes(cursor):
+    """Cho phép password_md5/password_sha256 để trống (profile production chỉ lưu bcrypt)"""
+    # SQLite không sửa được ràng buộc NOT NULL, phải dựng lại bảng
+    cursor.execute('''
+        CREATE TABLE users_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            phone TEXT,
+            password_hash TEXT NOT NULL,
+            password_md5 TEXT,
+            password_sha256 TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO users_new (id, username, email, phone, password_hash, password_md5,
+                               password_sha256, created_at, last_login, is_active)
+        SELECT id, username, email, phone, password_hash, password_md5,
+               password_sha256, created_at, last_login, is_active
+        FROM users
+    ''')
+    cursor.execute('DROP TABLE users')
+    cursor.execute('ALTER TABLE users_new RENAME TO users')
+
+
+def _email_outbox(cursor):
+    """Hàng đợi email bền vững cho worker gửi nền"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            recipient TEXT NOT NULL,
+            payload TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP,
+            sent_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+        ON email_outbox (status, next_attempt_at)
+    ''')
+
+
+def _sessions(cursor):
+    """Session lưu phía server, cookie chỉ giữ session id"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_sessions_expires
+        ON sessions (expires_at)
+    ''')
+
+
+# Bỏ dấu phân cách trong số điện thoại để tìm theo tiền tố ("0901..." khớp "090-123-...")
+PHONE_SEARCH_KEY = "replace(replace(replace(replace(replace(replace(coalesce({}, ''), ' ', ''), '-', ''), '.', ''), '(', ''), ')', ''), '+', '')"
+
+
+def _user_search(cursor):
+    """Index FTS5 cho tìm user theo username/email/phone và index cho phân trang keyset"""
+    # Contentless: chỉ giữ index, dữ liệu đọc từ users qua rowid = users.id
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS users_fts
+        USING fts5(username, email, phone, content='', prefix='2 3')
+    ''')
+    new_phone = PHONE_SEARCH_KEY.format('new.phone')
+    old_phone = PHONE_SEARCH_KEY.format('old.phone')
+    # Dựng lại bảng users (như migration 5) sẽ xóa các trigger này, phải tạo lại
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+            INSERT INTO users_fts (rowid, username, email, phone)
+            VALUES (new.id, new.username, new.email, {new_phone});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+            INSERT INTO users_fts (users_fts, rowid, username, email, phone)
+            VALUES ('delete', old.id, old.username, old.email, {old_phone});
+        END
+    ''')
+    # Chỉ chạy khi đổi các cột được index, cập nhật last_login/mật khẩu không chạm tới FTS
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF username, email, phone ON users BEGIN
+            INSERT INTO users_fts (users_fts, rowid, username, email, phone)
+            VALUES ('delete', old.id, old.username, old.email, {old_phone});
+            INSERT INTO users_fts (rowid, username, email, phone)
+            VALUES (new.id, new.username, new.email, {new_phone});
+        END
+    ''')
+    cursor.execute(f'''
+        INSERT INTO users_fts (rowid, username, email, phone)
+        SELECT id, username, email, {PHONE_SEARCH_KEY.format('phone')} FROM users
+    ''')
+    # Index kết thúc ngầm bằng rowid (id) nên ORDER BY cột, id đi thẳng theo index
+    for name, columns in (('created', 'created_at'), ('last_login', 'last_login'),
+                          ('active_created', 'is_active, created_at'),
+                          ('active_last_login', 'is_active, last_login')):
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_users_{name} ON users ({columns})')
+
+
+def _email_outbox_lease(cursor):
+    """Thời điểm worker nhận email để gửi: chỉ lấy lại email 'sending' đã quá hạn lease"""
+    cursor.execute('ALTER TABLE email_outbox ADD COLUMN claimed_at TIMESTAMP')
+
+
+def _login_history_attempted_email(cursor):
+    """Ghi cả lần đăng nhập bằng email không tồn tại: user_id được để trống, lưu email đã thử"""
+    # SQLite không sửa được ràng buộc NOT NULL, phải dựng lại bảng
+    cursor.execute('''
+        CREATE TABLE login_history_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            email TEXT,
+            login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ip_address TEXT,
+            user_agent TEXT,
+            status TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO login_history_new (id, user_id, login_time, ip_address, user_agent, status)
+        SELECT id, user_id, login_time, ip_address, user_agent, status FROM login_history
+    ''')
+    cursor.execute('DROP TABLE login_history')
+    cursor.execute('ALTER TABLE login_history_new RENAME TO login_history')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_login_history_user_time
+        ON login_history (user_id, login_time)
+    ''')
+    # Tra các lần thử theo email (credential stuffing vào email không tồn tại)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_login_history_email_time
+        ON login_history (email, login_time) WHERE email IS NOT NULL
+    ''')
+
+
+# (phiên bản, mô tả, hàm thực thi) - chỉ thêm vào cuối, không sửa migration đã phát hành
+MIGRATIONS = [
+    (1, 'initial schema', _initial_schema),
+    (2, 'otp and login history indexes', _lookup_indexes),
+    (3, 'login history daily rollup', _login_history_rollup),
+    (4, 'incremental auto vacuum', _incremental_vacuum),
+    (5, 'optional demo password hashes', _optional_demo_hashes),
+    (6, 'email outbox', _email_outbox),
+    (7, 'server-side sessions', _sessions),
+    (8, 'user search index', _user_search),
+    (9, 'email outbox lease', _email_outbox_lease),
+    (10, 'login history attempted email', _login_history_attempted_email),
+]
+
+
+def get_version(conn):
+    """Phiên bản schema hiện tại của database"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _run_non_transactional(conn, version, migrate, timeout=NON_TRANSACTIONAL_TIMEOUT):
+    """Chạy migration tự quản lý transaction (ví dụ VACUUM, phải idempotent).
+    Không giữ được BEGIN IMMEDIATE nên khi worker khác đang chạy cùng migration (SQLITE_BUSY)
+    thì chờ rồi kiểm tra lại: worker kia đã xong thì coi như thành công.
+    Trả về True nếu process này đã chạy migration"""
+    deadline = time.monotonic() + timeout
+    while True:
+        if get_version(conn) >= version:
+            return False
+        try:
+            migrate(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            return True
+        except sqlite3.OperationalError as e:
+            message = str(e).lower()
+            if ('locked' not in message and 'busy' not in message) or time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def run_migrations(conn, migrations=MIGRATIONS):
+    """Chạy các migration chưa áp dụng, trả về danh sách phiên bản vừa chạy"""
+    applied = []
+    for version, description, migrate in migrations:
+        if get_version(conn) >= version:
+            continue
+
+        if not getattr(migrate, 'transactional', True):
+            if _run_non_transactional(conn, version, migrate):
+                applied.append(version)
+                print(f"🔧 Migration {version}: {description}")
+            continue
+
+        # BEGIN IMMEDIATE giữ khóa ghi để nhiều worker khởi động cùng lúc không chạy trùng
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if get_version(conn) >= version:
+                conn.rollback()
+                continue
+            migrate(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        applied.append(version)
+        print(f"🔧 Migration {version}: {description}")
+    return applied
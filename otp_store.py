@@ -0,0 +1,117 @@
+"""
+OTP Store
+Nơi lưu mã OTP có thể thay thế: bảng otp_codes (SQLite) hoặc bộ nhớ process
+"""
+import heapq
+import hmac
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class SQLiteOTPStore:
+    """Lưu OTP trong bảng otp_codes, dùng chung được giữa nhiều worker"""
+    
+    def __init__(self, database):
+        self.db = database
+    
+    def save(self, user_id, otp_code, ttl_seconds):
+        """Lưu mã OTP với thời gian hết hạn"""
+        expires_at = datetime.now() + timedelta(seconds=ttl_seconds)
+        self.db.save_otp(user_id, otp_code, expires_at)
+    
+    def verify_and_consume(self, user_id, otp_code):
+        """Kiểm tra và đánh dấu đã dùng trong một câu lệnh"""
+        return self.db.consume_otp(user_id, otp_code)
+    
+    def stats(self):
+        return {'backend': 'sqlite'}
+
+
+class _Shard:
+    __slots__ = ('lock', 'codes', 'expiry')
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        # user_id -> (otp_code, thời điểm hết hạn theo monotonic)
+        self.codes = {}
+        # heap (thời điểm hết hạn, user_id) để dọn mã hết hạn
+        self.expiry = []
+
+
+class MemoryOTPStore:
+    """Lưu OTP trong bộ nhớ, chia shard theo user_id để giảm tranh chấp lock.
+    Mỗi user chỉ có tối đa một mã còn hiệu lực; chỉ dùng khi chạy một worker process."""
+    
+    def __init__(self, shards=None):
+        self.shard_count = shards or int(os.getenv('OTP_STORE_SHARDS', '16'))
+        self._shards = [_Shard() for _ in range(self.shard_count)]
+        self._lock = threading.Lock()
+        self._stats = {'saved': 0, 'verified': 0, 'rejected': 0, 'expired': 0}
+    
+    def _shard(self, user_id):
+        return self._shards[hash(user_id) % self.shard_count]
+    
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+    
+    def _sweep(self, shard, now):
+        """Xóa các mã đã hết hạn ở đầu heap (phải giữ lock của shard)"""
+        expired = 0
+        while shard.expiry and shard.expiry[0][0] <= now:
+            expires_at, user_id = heapq.heappop(shard.expiry)
+            entry = shard.codes.get(user_id)
+            # Mã đã được thay bằng mã mới thì entry trong heap đã cũ, bỏ qua
+            if entry is not None and entry[1] == expires_at:
+                del shard.codes[user_id]
+                expired += 1
+        return expired
+    
+    def save(self, user_id, otp_code, ttl_seconds):
+        """Lưu mã OTP, thay thế mã cũ của user nếu có"""
+        now = time.monotonic()
+        expires_at = now + ttl_seconds
+        shard = self._shard(user_id)
+        with shard.lock:
+            expired = self._sweep(shard, now)
+            shard.codes[user_id] = (str(otp_code), expires_at)
+            heapq.heappush(shard.expiry, (expires_at, user_id))
+        self._count('saved')
+        if expired:
+            self._count('expired', expired)
+    
+    def verify_and_consume(self, user_id, otp_code):
+        """Kiểm tra mã và xóa ngay nếu đúng (atomic trong shard)"""
+        now = time.monotonic()
+        shard = self._shard(user_id)
+        with shard.lock:
+            entry = shard.codes.get(user_id)
+            valid = (
+                entry is not None
+                and entry[1] > now
+                and hmac.compare_digest(entry[0].encode(), str(otp_code).encode())
+            )
+            if valid:
+                del shard.codes[user_id]
+        self._count('verified' if valid else 'rejected')
+        return valid
+    
+    def stats(self):
+        """Thống kê số mã đang lưu và số lần kiểm tra"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['backend'] = 'memory'
+        stats['live'] = sum(len(shard.codes) for shard in self._shards)
+        return stats
+
+
+def create_otp_store(database, backend=None):
+    """Tạo OTP store theo OTP_STORE (sqlite | memory)"""
+    backend = backend or os.getenv('OTP_STORE', 'sqlite')
+    if backend == 'memory':
+        return MemoryOTPStore()
+    if backend == 'sqlite':
+        return SQLiteOTPStore(database)
+    raise ValueError(f'OTP_STORE không hợp lệ: {backend}')
@@ -0,0 +1,88 @@
+"""
+Page Cache
+ETag yếu cho các trang phụ thuộc user (dashboard, hồ sơ, bảo mật) và cache LRU
+HTML đã render. ETag tính từ các trường user mà trang hiển thị cùng phiên bản
+template/static, nên request có If-None-Match khớp được trả 304 mà không render.
+Cache bị xóa theo user khi Database báo bản ghi user thay đổi.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Trang -> các trường user được hiển thị (đổi template thì cập nhật danh sách này)
+PAGE_FIELDS = {
+    'dashboard': ('id', 'username', 'email', 'last_login'),
+    'profile': ('id', 'username', 'email', 'phone', 'created_at', 'last_login'),
+    'security': ('id', 'email', 'password_hash', 'password_md5', 'password_sha256'),
+}
+# Trình duyệt luôn hỏi lại server (có thể nhận 304), proxy dùng chung không được lưu
+PAGE_CACHE_CONTROL = 'private, no-cache'
+
+
+def page_version(manifest, env, names):
+    """Phiên bản nội dung: hash manifest static và mã nguồn template,
+    giống nhau giữa các worker cùng bản deploy, đổi khi deploy bản mới"""
+    digest = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode('utf-8'))
+    for name in names:
+        source, _, _ = env.loader.get_source(env, name)
+        digest.update(name.encode('utf-8'))
+        digest.update(source.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class PageCache:
+    def __init__(self, max_size=None, version=''):
+        self.max_size = max_size if max_size is not None else int(os.getenv('PAGE_CACHE_SIZE', '5000'))
+        self.version = version
+        # (user_id, trang) -> (etag, html)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def etag(self, page, user):
+        """ETag của trang cho user: hash phiên bản và các trường trang hiển thị"""
+        values = [self.version, page] + [user.get(field) for field in PAGE_FIELDS[page]]
+        return hashlib.sha256(json.dumps(values, default=str).encode('utf-8')).hexdigest()[:20]
+
+    def get(self, user_id, page, etag):
+        """HTML đã render nếu còn khớp ETag, ngược lại None"""
+        with self._lock:
+            entry = self._entries.get((user_id, page))
+            if entry is None or entry[0] != etag:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end((user_id, page))
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def put(self, user_id, page, etag, html):
+        """Lưu HTML đã render của trang"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[(user_id, page)] = (etag, html)
+            self._entries.move_to_end((user_id, page))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, user_id=None):
+        """Xóa các trang của user (None = xóa toàn bộ)"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                for page in PAGE_FIELDS:
+                    self._entries.pop((user_id, page), None)
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        """Thống kê: hit rate, số trang đang cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
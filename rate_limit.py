@@ -0,0 +1,130 @@
+"""
+Rate Limiting
+Giới hạn số lần thử đăng nhập / OTP theo IP, email và user id
+bằng bộ đếm sliding window O(1) bộ nhớ mỗi key, tự loại key không còn hoạt động
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def parse_rule(value):
+    """'5/300' -> (5 lần, 300 giây)"""
+    limit, window = value.split('/')
+    return int(limit), float(window)
+
+
+class RateLimiter:
+    """Sliding window xấp xỉ: cửa sổ hiện tại + phần còn lại của cửa sổ trước"""
+
+    def __init__(self, limit, window, max_keys=None):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys or int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+        # key -> [bắt đầu cửa sổ hiện tại, số lần cửa sổ trước, số lần cửa sổ hiện tại]
+        # OrderedDict theo thứ tự dùng gần nhất để loại key cũ trong O(1)
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def _counter(self, key, now):
+        """Lấy bộ đếm của key đã trượt tới cửa sổ hiện tại (phải giữ lock)"""
+        counter = self._counters.get(key)
+        window_start = now - now % self.window
+        if counter is None:
+            counter = [window_start, 0, 0]
+            self._counters[key] = counter
+        elif counter[0] != window_start:
+            # Cửa sổ trước liền kề thì giữ số đếm, cũ hơn thì về 0
+            counter[1] = counter[2] if window_start - counter[0] == self.window else 0
+            counter[2] = 0
+            counter[0] = window_start
+        self._counters.move_to_end(key)
+        return counter
+
+    def _estimate(self, counter, now):
+        elapsed = (now - counter[0]) / self.window
+        return counter[1] * (1 - elapsed) + counter[2]
+
+    def _evict(self, now):
+        """Loại key đã rảnh quá 2 cửa sổ hoặc vượt quá max_keys (phải giữ lock)"""
+        counters = self._counters
+        while counters:
+            key, counter = next(iter(counters.items()))
+            if len(counters) > self.max_keys or now - counter[0] >= 2 * self.window:
+                del counters[key]
+            else:
+                break
+
+    def check(self, key, now=None):
+        """True nếu key còn được phép thêm một lần"""
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._estimate(self._counter(key, now), now) < self.limit
+
+    def add(self, key, now=None):
+        """Ghi nhận một lần cho key"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._counter(key, now)[2] += 1
+            self.allowed += 1
+            self._evict(now)
+
+    def reject(self):
+        """Ghi nhận một lần bị từ chối"""
+        with self._lock:
+            self.rejected += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'window': self.window,
+                'keys': len(self._counters),
+                'allowed': self.allowed,
+                'rejected': self.rejected,
+            }
+
+
+class Throttle:
+    """Nhóm các RateLimiter theo tên; một yêu cầu bị chặn nếu vượt bất kỳ giới hạn nào"""
+
+    def __init__(self, rules):
+        self.limiters = {name: RateLimiter(*rule) for name, rule in rules.items()}
+        # Kiểm tra và tính lượt phải là một bước: nếu tách rời, nhiều request song song
+        # cùng qua check trước khi bất kỳ request nào kịp add
+        self._lock = threading.Lock()
+
+    def allow(self, *checks):
+        """checks: các cặp (tên luật, key). Chỉ tính lượt khi tất cả đều còn hạn mức"""
+        checks = [(self.limiters[name], key) for name, key in checks if key is not None]
+        now = time.time()
+        with self._lock:
+            for limiter, key in checks:
+                if not limiter.check(key, now):
+                    limiter.reject()
+                    return False
+            for limiter, key in checks:
+                limiter.add(key, now)
+        return True
+
+    def stats(self):
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+
+DEFAULT_RULES = {
+    'login_ip': os.getenv('RATE_LIMIT_LOGIN_IP', '30/60'),
+    'login_email': os.getenv('RATE_LIMIT_LOGIN_EMAIL', '5/300'),
+    'otp_ip': os.getenv('RATE_LIMIT_OTP_IP', '30/60'),
+    'otp_user': os.getenv('RATE_LIMIT_OTP_USER', '5/300'),
+    'resend_ip': os.getenv('RATE_LIMIT_RESEND_IP', '10/60'),
+    'resend_user': os.getenv('RATE_LIMIT_RESEND_USER', '3/300'),
+}
+
+
+def create_login_throttle(rules=None):
+    """Throttle cho /login, /verify-otp và /resend-otp"""
+    rules = rules or DEFAULT_RULES
+    return Throttle({name: parse_rule(value) for name, value in rules.items()})
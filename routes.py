@@ -0,0 +1,205 @@
+"""
+Route Logic
+Logic các route dùng chung cho bản Flask (app.py) và bản async (asgi.py):
+kiểm tra form, rate limit, xác thực, OTP và thông báo. Mỗi hàm trả về một dict mô tả
+phản hồi (render template, redirect hoặc JSON, kèm thông báo flash) để từng app
+tự dựng response; các hàm đều có thể chặn (SQLite, bcrypt) nên asgi.py gọi qua executor.
+session là đối tượng session thật (không phải proxy), client là (ip, user agent).
+"""
+from services import db, auth_service, email_queue, login_throttle, login_audit, breached_passwords
+from user_admin import QueryError, admin_token, check_admin_token, find_users, parse_query
+from utils import generate_otp, validate_password_strength
+
+LOGIN_REQUIRED_MESSAGE = 'Vui lòng đăng nhập để tiếp tục'
+
+
+def page(template, message=None, category='error', status=200, **context):
+    """Render template (kèm thông báo flash nếu có)"""
+    return {'template': template, 'context': context, 'message': message, 'category': category,
+            'status': status}
+
+
+def redirect_to(endpoint, message=None, category='info'):
+    """Redirect tới endpoint (kèm thông báo flash nếu có)"""
+    return {'redirect': endpoint, 'message': message, 'category': category}
+
+
+def json_response(body, status=200, headers=None):
+    return {'json': body, 'status': status, 'headers': headers or {}}
+
+
+def record_login(client, user_id, status, email=None):
+    """Đưa lần đăng nhập vào buffer lịch sử, không chờ ghi database"""
+    ip_address, user_agent = client
+    login_audit.record(user_id, ip_address, user_agent, status, email)
+
+
+def register(form):
+    """Đăng ký tài khoản mới"""
+    username = form.get('username')
+    email = form.get('email')
+    password = form.get('password')
+    confirm_password = form.get('confirm_password')
+    phone = form.get('phone', '')
+
+    # Validation
+    if not all([username, email, password, confirm_password]):
+        return page('register.html', 'Vui lòng điền đầy đủ thông tin')
+
+    if password != confirm_password:
+        return page('register.html', 'Mật khẩu xác nhận không khớp')
+
+    strength = validate_password_strength(password, breached_passwords)
+    if not strength['valid']:
+        return page('register.html', strength['message'])
+
+    # Đăng ký user
+    result = auth_service.register_user(username, email, password, phone)
+
+    if result['success']:
+        return redirect_to('login', 'Đăng ký thành công! Vui lòng đăng nhập', 'success')
+    return page('register.html', result['message'])
+
+
+def login(form, session, client):
+    """Đăng nhập - Bước 1: Xác thực mật khẩu"""
+    email = form.get('email')
+    password = form.get('password')
+
+    if not all([email, password]):
+        return page('login.html', 'Vui lòng điền đầy đủ thông tin')
+
+    # Chặn brute-force trước khi tốn bcrypt
+    if not login_throttle.allow(('login_ip', client[0]), ('login_email', email.lower())):
+        return page('login.html', 'Bạn đã thử quá nhiều lần. Vui lòng thử lại sau', status=429)
+
+    # Xác thực mật khẩu
+    result = auth_service.authenticate_user(email, password)
+
+    if not result['success']:
+        record_login(client, result.get('user_id'), result.get('status'), email)
+        return page('login.html', result['message'])
+
+    user = result['user']
+    record_login(client, user['id'], 'password_ok', email)
+
+    # Tạo OTP và đưa email vào hàng đợi, worker nền sẽ gửi
+    otp_code = generate_otp()
+    auth_service.save_otp(user['id'], otp_code)
+    email_sent = email_queue.enqueue_otp(user['email'], user['username'], otp_code)
+
+    if not email_sent:
+        return page('login.html', 'Không thể gửi OTP. Vui lòng thử lại')
+
+    # Lưu thông tin tạm vào session
+    session['temp_user_id'] = user['id']
+    session['temp_email'] = user['email']
+    return redirect_to('verify_otp', 'OTP đã được gửi đến email của bạn')
+
+
+def verify_otp(form, session, client):
+    """Đăng nhập - Bước 2: Xác thực OTP (form None = GET)"""
+    if 'temp_user_id' not in session:
+        return redirect_to('login', 'Phiên làm việc hết hạn. Vui lòng đăng nhập lại', 'warning')
+
+    if form is None:
+        return page('verify_otp.html', email=session.get('temp_email'))
+
+    otp_code = form.get('otp')
+    user_id = session.get('temp_user_id')
+
+    if not otp_code:
+        return page('verify_otp.html', 'Vui lòng nhập mã OTP')
+
+    if not login_throttle.allow(('otp_ip', client[0]), ('otp_user', user_id)):
+        return page('verify_otp.html', 'Bạn đã nhập sai quá nhiều lần. Vui lòng thử lại sau',
+                    status=429, email=session.get('temp_email'))
+
+    # Xác thực OTP
+    if not auth_service.verify_otp(user_id, otp_code):
+        record_login(client, user_id, 'otp_failed')
+        return page('verify_otp.html', 'Mã OTP không đúng hoặc đã hết hạn', email=session.get('temp_email'))
+
+    # Đăng nhập thành công
+    user = db.get_user_by_id(user_id)
+    session.regenerate()
+    session.permanent = True
+    session['user_id'] = user['id']
+    session['username'] = user['username']
+    session['email'] = user['email']
+
+    # Xóa thông tin tạm
+    session.pop('temp_user_id', None)
+    session.pop('temp_email', None)
+
+    # Ghi lịch sử và last login (ghi xuống database theo lô)
+    record_login(client, user_id, 'success')
+
+    return redirect_to('dashboard', f'Chào mừng {user["username"]}!', 'success')
+
+
+def resend_otp(session, client):
+    """Gửi lại mã OTP"""
+    if 'temp_user_id' not in session:
+        return json_response({'success': False, 'message': 'Phiên làm việc hết hạn'})
+
+    user_id = session.get('temp_user_id')
+    if not login_throttle.allow(('resend_ip', client[0]), ('resend_user', user_id)):
+        return json_response({'success': False, 'message': 'Bạn đã yêu cầu quá nhiều lần. Vui lòng thử lại sau'}, 429)
+
+    user = db.get_user_by_id(user_id)
+
+    # Tạo OTP mới và gửi qua hàng đợi
+    otp_code = generate_otp()
+    auth_service.save_otp(user_id, otp_code)
+    email_sent = email_queue.enqueue_otp(user['email'], user['username'], otp_code)
+
+    if email_sent:
+        return json_response({'success': True, 'message': 'OTP mới đã được gửi'})
+    return json_response({'success': False, 'message': 'Không thể gửi OTP'})
+
+
+def change_password(form, session):
+    """Đổi mật khẩu"""
+    current_password = form.get('current_password')
+    new_password = form.get('new_password')
+    confirm_password = form.get('confirm_password')
+
+    if not all([current_password, new_password, confirm_password]):
+        return redirect_to('security', 'Vui lòng điền đầy đủ thông tin', 'error')
+
+    if new_password != confirm_password:
+        return redirect_to('security', 'Mật khẩu mới không khớp', 'error')
+
+    strength = validate_password_strength(new_password, breached_passwords)
+    if not strength['valid']:
+        return redirect_to('security', strength['message'], 'error')
+
+    # Đổi mật khẩu
+    result = auth_service.change_password(session['user_id'], current_password, new_password)
+
+    if result['success']:
+        return redirect_to('security', 'Đổi mật khẩu thành công', 'success')
+    return redirect_to('security', result['message'], 'error')
+
+
+def logout(session):
+    """Đăng xuất"""
+    username = session.get('username', 'User')
+    session.clear()
+    return redirect_to('index', f'Tạm biệt {username}!')
+
+
+def admin_users(authorization, args):
+    """API cho bộ phận hỗ trợ: tìm kiếm (?q=) và liệt kê user, phân trang bằng cursor.
+    None nếu API đang tắt (chưa đặt ADMIN_API_TOKEN)"""
+    if admin_token() is None:
+        return None
+    if not check_admin_token(authorization):
+        return json_response({'success': False, 'message': 'Token không hợp lệ'}, 401,
+                             {'WWW-Authenticate': 'Bearer'})
+    try:
+        query = parse_query(args)
+    except QueryError as e:
+        return json_response({'success': False, 'message': str(e)}, 400)
+    return json_response({'success': True, **find_users(db, query)})
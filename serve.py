@@ -0,0 +1,51 @@
+"""
+Production Launcher
+Chạy bản ASGI (asgi.py) bằng uvicorn với nhiều worker process thay cho debug server
+
+Chạy: python serve.py [--workers 4] [--host 0.0.0.0] [--port 5000]
+"""
+import argparse
+import os
+
+import uvicorn
+
+from hashing import resolve_bcrypt_cost
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Chạy Secure Auth System (ASGI)')
+    parser.add_argument('--host', default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '5000')))
+    parser.add_argument('--workers', type=int,
+                        default=int(os.getenv('WEB_WORKERS', str(os.cpu_count() or 1))))
+    parser.add_argument('--log-level', default=os.getenv('LOG_LEVEL', 'info'))
+    args = parser.parse_args()
+    
+    # OTP trong bộ nhớ chỉ nằm ở worker đã tạo ra nó: request xác thực sang worker khác sẽ luôn sai
+    if os.getenv('OTP_STORE', 'sqlite') == 'memory' and args.workers > 1:
+        print(f"⚠️  OTP_STORE=memory không dùng chung được giữa {args.workers} worker, chỉ chạy 1 worker "
+              f"(đặt OTP_STORE=sqlite để chạy nhiều worker)")
+        args.workers = 1
+    
+    # Chia CPU cho process pool bcrypt của từng worker thay vì mỗi worker dùng hết CPU
+    if not os.getenv('HASH_WORKERS'):
+        os.environ['HASH_WORKERS'] = str(max(1, (os.cpu_count() or 1) // args.workers))
+    
+    # Đo cost bcrypt một lần ở process cha, các worker nhận qua BCRYPT_COST nên dùng cùng cost
+    cost = resolve_bcrypt_cost()
+    os.environ['BCRYPT_COST'] = str(cost)
+    
+    print(f"🔐 bcrypt cost {cost}")
+    print(f"🚀 Server đang chạy tại http://{args.host}:{args.port} ({args.workers} workers)")
+    uvicorn.run(
+        'asgi:app',
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        proxy_headers=True,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Services
+Khởi tạo các service dùng chung cho bản Flask (app.py) và bản async (asgi.py)
+"""
+from database import Database
+from auth import AuthService
+from hashing import HashingExecutor
+from email_service import EmailService
+from email_queue import EmailQueue
+from maintenance import MaintenanceJob
+from rate_limit import create_login_throttle
+from audit_log import LoginAuditWriter
+from breached import BreachedPasswords
+from metrics import metrics
+from page_cache import PageCache
+
+db = Database()
+hasher = HashingExecutor()
+auth_service = AuthService(db, hasher)
+email_service = EmailService()
+email_queue = EmailQueue(db, email_service)
+maintenance_job = MaintenanceJob(db)
+login_throttle = create_login_throttle()
+login_audit = LoginAuditWriter(db)
+page_cache = PageCache()
+# Bloom filter mật khẩu bị lộ (mmap, dùng chung giữa worker); None nếu chưa build
+breached_passwords = BreachedPasswords.open()
+# HTML đã render của user bị bỏ khi đổi mật khẩu, cập nhật last_login...
+db.on_user_change(page_cache.invalidate)
+
+
+def collect_service_stats():
+    """Gauge từ thống kê sẵn có của pool, cache, bcrypt, hàng đợi email và rate limit"""
+    for pool, stats in db.pool_stats().items():
+        for key in ('open', 'in_use', 'checkouts', 'timeouts', 'wait_time_total'):
+            if key in stats:
+                yield f'db_pool_{key}', {'pool': pool}, stats[key]
+    cache = db.user_cache.stats()
+    for key in ('size', 'hits', 'misses', 'evictions'):
+        if key in cache:
+            yield f'user_cache_{key}', {}, cache[key]
+    pages = page_cache.stats()
+    for key in ('size', 'hits', 'misses', 'evictions'):
+        yield f'page_cache_{key}', {}, pages[key]
+    hashing = hasher.stats()
+    for key in ('in_flight', 'queue_depth', 'rejected', 'timeouts'):
+        if key in hashing:
+            yield f'hashing_{key}', {}, hashing[key]
+    for status, count in email_queue.stats().items():
+        yield 'email_outbox_messages', {'status': status}, count
+    for key, value in login_audit.stats().items():
+        yield f'login_audit_{key}', {}, value
+    for rule, stats in login_throttle.stats().items():
+        yield 'rate_limit_rejected', {'rule': rule}, stats['rejected']
+
+
+metrics.add_collector(collect_service_stats)
+
+
+def start_background_services():
+    """Khởi tạo database và các job nền, gọi một lần khi process khởi động"""
+    # Khởi tạo database
+    db.init_db()
+    
+    # Profile production: xóa các hash MD5/SHA-256 demo còn sót lại
+    if auth_service.hash_profile == 'production':
+        db.clear_demo_hashes()
+    
+    # Worker gửi email nền
+    email_queue.start()
+    
+    # Ghi lịch sử đăng nhập theo lô
+    login_audit.start()
+    
+    # Dọn OTP hết hạn và lịch sử đăng nhập cũ định kỳ
+    maintenance_job.start()
+
+
+def stop_background_services():
+    """Dừng các job nền và giải phóng tài nguyên"""
+    maintenance_job.stop(timeout=5)
+    email_queue.stop(timeout=5)
+    login_audit.stop(timeout=5)
+    hasher.shutdown(wait=False)
+    db.close()
@@ -0,0 +1,91 @@
+"""
+Session Store
+Session lưu phía server trong SQLite: cookie chỉ chứa session id ngẫu nhiên,
+mọi worker đọc chung một bảng sessions, session hết hạn được maintenance xóa theo lô
+"""
+import json
+import os
+import secrets
+import time
+
+from flask.sessions import SecureCookieSession, SessionInterface
+
+
+class ServerSession(SecureCookieSession):
+    """Dữ liệu session kèm id và hạn lưu trên server"""
+
+    def __init__(self, initial=None, sid=None, expires_at=0):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.rotate = False
+
+    def regenerate(self):
+        """Cấp session id mới khi lưu (gọi sau khi đăng nhập để chống session fixation)"""
+        self.rotate = True
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    """SessionInterface của Flask đọc/ghi session qua Database"""
+    session_class = ServerSession
+
+    def __init__(self, database, touch_interval=None):
+        self.db = database
+        # Session không đổi chỉ được gia hạn khi đã qua touch_interval giây, tránh ghi mỗi request
+        self.touch_interval = touch_interval or int(os.getenv('SESSION_TOUCH_INTERVAL', '60'))
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            record = self.db.get_session(sid, int(time.time()))
+            if record:
+                data, expires_at = record
+                return self.session_class(json.loads(data), sid=sid, expires_at=expires_at)
+        return self.session_class()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        # Session rỗng: xóa bản ghi và cookie
+        if not session:
+            if session.sid is not None and session.modified:
+                self.db.delete_session(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        now = int(time.time())
+        expires_at = now + int(app.permanent_session_lifetime.total_seconds())
+
+        if session.sid is None or session.rotate:
+            if session.sid is not None:
+                self.db.delete_session(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            session.rotate = False
+            self.db.save_session(session.sid, self._serialize(session), expires_at)
+        elif session.modified:
+            self.db.save_session(session.sid, self._serialize(session), expires_at)
+        elif self.should_set_cookie(app, session) and expires_at - session.expires_at >= self.touch_interval:
+            self.db.touch_session(session.sid, expires_at)
+        else:
+            return
+        session.expires_at = expires_at
+
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    @staticmethod
+    def _serialize(session):
+        return json.dumps(dict(session), separators=(',', ':'))
@@ -0,0 +1,196 @@
+"""
+SMTP Connection Pool
+Giữ các phiên SMTP đã STARTTLS + login để dùng lại giữa các email,
+loại bỏ phiên rảnh quá lâu và tự kết nối lại khi phiên bị ngắt
+"""
+import os
+import queue
+import smtplib
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+# Email đã serialize sẵn: người gửi, danh sách người nhận, nội dung bytes (CRLF)
+RawMessage = namedtuple('RawMessage', ['sender', 'recipients', 'data'])
+
+# Lỗi cho thấy phiên SMTP không còn dùng được
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError)
+
+
+class SMTPConnectionPool:
+    def __init__(self, host, port, username=None, password=None, use_tls=True, timeout=10.0,
+                 size=None, max_idle=None, max_messages=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.size = size or int(os.getenv('SMTP_POOL_SIZE', '4'))
+        # Nhiều nhà cung cấp tự đóng phiên rảnh sau khoảng 60s
+        self.max_idle = max_idle or float(os.getenv('SMTP_POOL_MAX_IDLE', '50'))
+        self.max_messages = max_messages or int(os.getenv('SMTP_POOL_MAX_MESSAGES', '100'))
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._stats = {
+            'opened': 0,
+            'reused': 0,
+            'evicted': 0,
+            'reconnects': 0,
+            'sent': 0,
+            'failed': 0,
+            'send_time_total': 0.0,
+            'send_time_max': 0.0,
+        }
+    
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+    
+    def _open(self):
+        """Mở phiên SMTP mới đã xác thực"""
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.use_tls:
+                server.starttls()
+                server.ehlo()
+            if self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            self._quit(server)
+            raise
+        self._count('opened')
+        # [phiên, thời điểm dùng cuối, số email đã gửi]
+        return [server, time.monotonic(), 0]
+    
+    def _quit(self, server):
+        """Đóng phiên, bỏ qua lỗi khi server đã ngắt"""
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+    
+    def _checkout(self):
+        """Lấy phiên rảnh còn hạn hoặc mở phiên mới"""
+        now = time.monotonic()
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                return self._open()
+            if now - session[1] > self.max_idle:
+                self._quit(session[0])
+                self._count('evicted')
+                continue
+            self._count('reused')
+            return session
+    
+    @contextmanager
+    def session(self):
+        """Mượn một phiên SMTP; phiên lỗi kết nối sẽ bị đóng thay vì trả về pool"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise smtplib.SMTPException('Hết thời gian chờ phiên SMTP')
+        session = None
+        try:
+            session = self._checkout()
+            yield session
+        except _CONNECTION_ERRORS:
+            if session is not None:
+                self._quit(session[0])
+                session = None
+            raise
+        finally:
+            # sock là None khi phiên đã bị đóng (ví dụ mở lại phiên thất bại)
+            if session is not None and session[0].sock is not None:
+                session[1] = time.monotonic()
+                if session[2] >= self.max_messages:
+                    self._quit(session[0])
+                else:
+                    self._idle.put(session)
+            self._slots.release()
+    
+    def _transmit(self, server, message):
+        """Gửi RawMessage hoặc email.message.Message"""
+        if isinstance(message, RawMessage):
+            server.sendmail(message.sender, message.recipients, message.data)
+        else:
+            server.send_message(message)
+    
+    def _send_one(self, session, message):
+        """Gửi một message trên phiên, kết nối lại một lần nếu phiên đã bị server đóng"""
+        start = time.perf_counter()
+        try:
+            self._transmit(session[0], message)
+        except _CONNECTION_ERRORS:
+            self._quit(session[0])
+            self._count('reconnects')
+            session[:] = self._open()
+            self._transmit(session[0], message)
+        session[2] += 1
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats['sent'] += 1
+            self._stats['send_time_total'] += elapsed
+            self._stats['send_time_max'] = max(self._stats['send_time_max'], elapsed)
+    
+    def send(self, message):
+        """Gửi một message, lỗi được ném ra"""
+        with self.session() as session:
+            try:
+                self._send_one(session, message)
+            except Exception:
+                self._count('failed')
+                raise
+    
+    def send_many(self, messages):
+        """Gửi nhiều message liên tiếp trên cùng phiên,
+        trả về danh sách lỗi tương ứng (None nếu thành công)"""
+        errors = [None] * len(messages)
+        if not messages:
+            return errors
+        
+        index = 0
+        try:
+            with self.session() as session:
+                for index, message in enumerate(messages):
+                    try:
+                        self._send_one(session, message)
+                    except _CONNECTION_ERRORS:
+                        raise
+                    except smtplib.SMTPException as e:
+                        # Lỗi riêng của message (ví dụ người nhận bị từ chối): phiên vẫn dùng được
+                        errors[index] = str(e)
+                        self._count('failed')
+                    if session[2] >= self.max_messages and index + 1 < len(messages):
+                        # Phiên đã gửi đủ giới hạn: mở phiên mới cho phần còn lại
+                        self._quit(session[0])
+                        session[:] = self._open()
+        except Exception as e:
+            # Không kết nối được: các message chưa gửi đều lỗi
+            for i in range(index, len(messages)):
+                if errors[i] is None:
+                    errors[i] = str(e)
+                    self._count('failed')
+        return errors
+    
+    def stats(self):
+        """Thống kê: tỉ lệ dùng lại phiên và độ trễ gửi"""
+        with self._lock:
+            stats = dict(self._stats)
+        checkouts = stats['opened'] + stats['reused']
+        stats['idle'] = self._idle.qsize()
+        stats['reuse_rate'] = stats['reused'] / checkouts if checkouts else 0.0
+        stats['send_time_avg'] = stats['send_time_total'] / (stats['sent'] or 1)
+        return stats
+    
+    def close(self):
+        """Đóng mọi phiên đang rảnh"""
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(session[0])
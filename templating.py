@@ -0,0 +1,77 @@
+"""
+Template Precompilation
+Biên dịch toàn bộ template Jinja khi khởi động và lưu bytecode vào thư mục
+dùng chung trên đĩa, worker mới (sau deploy/recycle) chỉ cần nạp bytecode
+thay vì parse lại. Template email (templates/email/) đã có bộ biên dịch riêng nên bỏ qua.
+
+Chạy: python templating.py  (build bytecode cache trước khi deploy)
+"""
+import os
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(ROOT, '.jinja_cache')
+SKIP_PREFIXES = ('email/',)
+
+
+def _env_flag(name):
+    """None nếu biến môi trường không được đặt"""
+    value = os.getenv(name)
+    return None if value is None else value == '1'
+
+
+def page_templates(env):
+    """Tên các template trang web (bỏ template email)"""
+    return sorted(env.list_templates(filter_func=lambda name: not name.startswith(SKIP_PREFIXES)))
+
+
+def precompile_templates(env):
+    """Nạp trước mọi template vào cache của environment, trả về số template và thời gian"""
+    start = time.perf_counter()
+    names = page_templates(env)
+    for name in names:
+        env.get_template(name)
+    return len(names), time.perf_counter() - start
+
+
+def configure_templates(app, cache_dir=None, auto_reload=None, precompile=None):
+    """Bật bytecode cache trên đĩa, cấu hình auto-reload và biên dịch trước template"""
+    cache_dir = cache_dir or os.getenv('TEMPLATE_CACHE_DIR', DEFAULT_CACHE_DIR)
+    if auto_reload is None:
+        auto_reload = _env_flag('TEMPLATES_AUTO_RELOAD')
+    if precompile is None:
+        precompile = os.getenv('TEMPLATE_PRECOMPILE', '1') == '1'
+
+    # Flask và Quart (bản async) sinh code khác nhau nên không dùng chung bytecode
+    cache_dir = os.path.join(cache_dir, type(app).__name__.lower())
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    except OSError as e:
+        print(f"⚠️  Không dùng được bytecode cache: {str(e)}")
+
+    # Mặc định chỉ reload khi debug: production không kiểm tra mtime template ở mỗi lần render
+    if auto_reload is not None:
+        app.config['TEMPLATES_AUTO_RELOAD'] = auto_reload
+        app.jinja_env.auto_reload = auto_reload
+
+    if precompile:
+        return precompile_templates(app.jinja_env)
+    return 0, 0.0
+
+
+if __name__ == '__main__':
+    from flask import Flask
+    flavors = [Flask]
+    try:
+        from quart import Quart
+        flavors.append(Quart)
+    except ImportError:
+        pass
+
+    for flavor in flavors:
+        # Cùng root_path với app.py/asgi.py để khóa cache (theo đường dẫn template) trùng nhau
+        count, elapsed = configure_templates(flavor('app', root_path=ROOT), precompile=True)
+        print(f"✅ {flavor.__name__}: {count} templates in {elapsed * 1000:.1f} ms")
@@ -0,0 +1,14 @@
+from audit_log import LoginAuditWriter
+from database import Database
+
+
+def test_unknown_email_attempt_is_recorded(tmp_path):
+    db = Database(str(tmp_path / 'audit.db'))
+    db.init_db()
+    try:
+        LoginAuditWriter(db).record(None, '203.0.113.7', 'curl/8.0', 'unknown_email', 'ghost@example.com')
+        with db.connection() as conn:
+            rows = conn.execute('SELECT user_id, email, ip_address, user_agent, status FROM login_history').fetchall()
+        assert [tuple(row) for row in rows] == [(None, 'ghost@example.com', '203.0.113.7', 'curl/8.0', 'unknown_email')]
+    finally:
+        db.close()
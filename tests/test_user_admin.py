@@ -0,0 +1,15 @@
+import pytest
+
+from user_admin import QueryError, parse_query
+
+
+@pytest.mark.parametrize('value', ['2024-13-45', '2024-02-30', '2024-01-01 25:00', 'yesterday'])
+def test_impossible_dates_are_rejected(value):
+    with pytest.raises(QueryError):
+        parse_query({'created_after': value})
+
+
+def test_valid_dates_are_normalized():
+    query = parse_query({'created_after': '2024-1-5', 'last_login_before': '2024-02-29T08:30'})
+    assert query['created_after'] == '2024-01-05'
+    assert query['last_login_before'] == '2024-02-29 08:30'
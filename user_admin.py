@@ -0,0 +1,183 @@
+"""
+User Admin
+Tìm kiếm và liệt kê user cho bộ phận hỗ trợ: tìm theo tiền tố username/email/phone
+(index FTS5), lọc theo trạng thái, ngày tạo, lần đăng nhập cuối, phân trang keyset
+bằng cursor nên trang sâu vẫn nhanh như trang đầu. Dùng chung cho API
+GET /admin/api/users (cần ADMIN_API_TOKEN) và CLI.
+
+Chạy: python user_admin.py search nguyen [--active 1]
+      python user_admin.py list --sort last_login --desc [--created-after 2024-01-01] [--cursor ...]
+"""
+import argparse
+import base64
+import hmac
+import json
+import os
+import sys
+from datetime import datetime
+
+from database import USER_SORT_KEYS
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+FILTERS = ('created_after', 'created_before', 'last_login_after', 'last_login_before')
+TIMESTAMP_FORMATS = ('%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S')
+_BOOLEANS = {'1': True, 'true': True, 'yes': True, '0': False, 'false': False, 'no': False}
+
+
+class QueryError(ValueError):
+    """Tham số tìm kiếm không hợp lệ"""
+    pass
+
+
+def encode_cursor(sort, key):
+    """Cursor mờ (base64) chứa kiểu sắp xếp và khóa của dòng cuối trang"""
+    raw = json.dumps([sort, key], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """Khóa trong cursor, báo lỗi nếu cursor hỏng hoặc của kiểu sắp xếp khác"""
+    try:
+        cursor_sort, key = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise QueryError('Cursor không hợp lệ')
+    if cursor_sort != sort:
+        raise QueryError('Cursor không thuộc kiểu sắp xếp này')
+    if sort in ('id', 'search'):
+        if not _is_id(key):
+            raise QueryError('Cursor không hợp lệ')
+        return key
+    # created_at/last_login là chuỗi thời gian (created_at có thể NULL, danh sách theo last_login
+    # đã bỏ NULL); kiểu khác như list/dict sẽ lỗi khi bind vào SQLite
+    if not (isinstance(key, list) and len(key) == 2 and _is_id(key[1])
+            and (isinstance(key[0], str) or (key[0] is None and sort == 'created_at'))):
+        raise QueryError('Cursor không hợp lệ')
+    return tuple(key)
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _normalize_timestamp(value):
+    """Ngày giờ có thật viết lại đủ hai chữ số (SQL so sánh dạng chuỗi), None nếu không hợp lệ"""
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime(fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_query(args):
+    """Chuẩn hóa tham số (request.args hoặc dict từ CLI) thành truy vấn cho find_users"""
+    query = {'text': (args.get('q') or '').strip() or None}
+
+    active = args.get('is_active')
+    if active in (None, ''):
+        query['is_active'] = None
+    elif str(active).lower() in _BOOLEANS:
+        query['is_active'] = _BOOLEANS[str(active).lower()]
+    else:
+        raise QueryError('is_active phải là 1 hoặc 0')
+
+    for name in FILTERS:
+        value = (args.get(name) or '').strip().replace('T', ' ') or None
+        if value is not None:
+            value = _normalize_timestamp(value)
+            if value is None:
+                raise QueryError(f'{name} phải có dạng YYYY-MM-DD hoặc YYYY-MM-DD HH:MM:SS')
+        query[name] = value
+
+    query['sort'] = 'search' if query['text'] else (args.get('sort') or 'id')
+    if query['sort'] not in USER_SORT_KEYS + ('search',):
+        raise QueryError(f"sort phải là một trong: {', '.join(USER_SORT_KEYS)}")
+    order = (args.get('order') or 'asc').lower()
+    if order not in ('asc', 'desc'):
+        raise QueryError('order phải là asc hoặc desc')
+    query['descending'] = order == 'desc'
+
+    try:
+        query['limit'] = min(max(int(args.get('limit') or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        raise QueryError('limit phải là số')
+
+    cursor = args.get('cursor')
+    query['after'] = decode_cursor(cursor, query['sort']) if cursor else None
+    return query
+
+
+def find_users(database, query):
+    """Một trang kết quả: {'users': [...], 'next_cursor': cursor trang sau hoặc None}"""
+    filters = {name: query[name] for name in FILTERS}
+    # Lấy thêm một dòng để biết còn trang sau mà không cần COUNT(*)
+    if query['text']:
+        rows = database.search_users(query['text'], query['is_active'], after_id=query['after'],
+                                     limit=query['limit'] + 1, **filters)
+    else:
+        rows = database.list_users(query['is_active'], sort=query['sort'], descending=query['descending'],
+                                   after=query['after'], limit=query['limit'] + 1, **filters)
+    next_cursor = None
+    if len(rows) > query['limit']:
+        rows = rows[:query['limit']]
+        last = rows[-1]
+        key = last['id'] if query['sort'] in ('id', 'search') else [last[query['sort']], last['id']]
+        next_cursor = encode_cursor(query['sort'], key)
+    return {'users': rows, 'next_cursor': next_cursor}
+
+
+def admin_token():
+    """Token của API admin, None = API tắt"""
+    return os.getenv('ADMIN_API_TOKEN') or None
+
+
+def check_admin_token(authorization):
+    """Kiểm tra header Authorization: Bearer <token> (so sánh thời gian hằng)"""
+    token = admin_token()
+    if not token or not authorization or not authorization.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(authorization[7:].encode('utf-8'), token.encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tìm kiếm và liệt kê user')
+    parser.add_argument('--db', default='secure_auth.db')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    search = sub.add_parser('search', help='Tìm theo tiền tố username, email, số điện thoại')
+    search.add_argument('q', help='chuỗi tìm kiếm')
+    listing = sub.add_parser('list', help='Liệt kê user theo bộ lọc')
+    listing.add_argument('--sort', choices=USER_SORT_KEYS, default='id')
+    listing.add_argument('--desc', action='store_true', help='sắp xếp giảm dần')
+    for command in (search, listing):
+        command.add_argument('--active', choices=('1', '0'), help='lọc theo is_active')
+        for name in FILTERS:
+            command.add_argument(f"--{name.replace('_', '-')}", help='YYYY-MM-DD[ HH:MM:SS] (UTC)')
+        command.add_argument('--limit', type=int, default=DEFAULT_PAGE_SIZE)
+        command.add_argument('--cursor', help='cursor trang sau từ lần chạy trước')
+    args = parser.parse_args()
+
+    params = {name: getattr(args, name) for name in FILTERS}
+    params.update(q=getattr(args, 'q', None), is_active=args.active, limit=args.limit, cursor=args.cursor,
+                  sort=getattr(args, 'sort', None), order='desc' if getattr(args, 'desc', False) else 'asc')
+
+    from database import Database
+    db = Database(args.db)
+    db.init_db()
+    try:
+        page = find_users(db, parse_query(params))
+    except QueryError as e:
+        parser.error(str(e))
+    finally:
+        db.close()
+
+    for user in page['users']:
+        print(json.dumps(user, ensure_ascii=False))
+    print(f"✅ {len(page['users'])} user", file=sys.stderr)
+    if page['next_cursor']:
+        print(f"➡️  Trang sau: --cursor {page['next_cursor']}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+User Cache
+Cache LRU có TTL cho bản ghi user, tra theo id hoặc email
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class UserCache:
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size if max_size is not None else int(os.getenv('USER_CACHE_SIZE', '10000'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('USER_CACHE_TTL', '30'))
+        # id -> (thời điểm hết hạn, bản ghi); email -> id
+        self._entries = OrderedDict()
+        self._emails = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+    
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+    
+    def _lookup(self, user_id):
+        """Tra cache theo id (phải giữ lock), trả về bản sao bản ghi hoặc None"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self._stats['misses'] += 1
+            return None
+        if entry[0] < time.monotonic():
+            self._remove(user_id)
+            self._stats['misses'] += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self._stats['hits'] += 1
+        return dict(entry[1])
+    
+    def get(self, user_id):
+        """Lấy user theo id"""
+        with self._lock:
+            return self._lookup(user_id)
+    
+    def get_by_email(self, email):
+        """Lấy user theo email"""
+        with self._lock:
+            user_id = self._emails.get(email)
+            if user_id is None:
+                self._stats['misses'] += 1
+                return None
+            return self._lookup(user_id)
+    
+    def put(self, user):
+        """Lưu bản ghi user (dict) vào cache"""
+        if not self.enabled or user is None:
+            return
+        with self._lock:
+            self._remove(user['id'])
+            self._entries[user['id']] = (time.monotonic() + self.ttl, dict(user))
+            self._emails[user['email']] = user['id']
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+    
+    def _remove(self, user_id):
+        """Xóa một entry (phải giữ lock)"""
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._emails.pop(entry[1]['email'], None)
+    
+    def invalidate(self, user_id=None, email=None):
+        """Xóa user khỏi cache theo id và/hoặc email"""
+        with self._lock:
+            if email is not None and user_id is None:
+                user_id = self._emails.get(email)
+            if user_id is not None:
+                self._remove(user_id)
+            if email is not None:
+                self._emails.pop(email, None)
+            self._stats['invalidations'] += 1
+    
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            self._entries.clear()
+            self._emails.clear()
+            self._stats['invalidations'] += 1
+    
+    def stats(self):
+        """Thống kê: hit rate, số entry, số lần loại bỏ"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
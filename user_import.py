@@ -0,0 +1,258 @@
+"""
+User Import/Export
+Tạo hàng loạt tài khoản từ CSV/JSONL: đọc dạng stream, băm bcrypt song song
+trên nhiều core, insert từng lô bằng executemany; lỗi từng dòng (trùng email,
+username...) được báo lại mà không dừng cả lô. Xuất user ra CSV/JSONL dạng stream.
+
+Chạy: python user_import.py import users.csv [--workers 8] [--errors errors.jsonl]
+      python user_import.py export users.jsonl [--include-hash]
+Cột: username, email, password (hoặc password_hash bcrypt có sẵn), phone
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from breached import BreachedPasswords
+from hashing import pool_context, resolve_bcrypt_cost
+from utils import (hash_password_bcrypt, hash_password_md5, hash_password_sha256,
+                   get_bcrypt_cost, validate_email, validate_password_strength)
+
+FORMATS = ('csv', 'jsonl')
+EXPORT_FIELDS = ('id', 'username', 'email', 'phone', 'created_at', 'last_login', 'is_active')
+
+
+def detect_format(path, fmt=None):
+    """Định dạng theo tham số hoặc đuôi file"""
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    if fmt not in FORMATS:
+        raise ValueError(f'Định dạng không hỗ trợ: {fmt}')
+    return fmt
+
+
+def read_users(file, fmt):
+    """Đọc từng dòng (số dòng, dict) từ file CSV có header hoặc JSONL"""
+    if fmt == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_no, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, {'_error': f'JSON không hợp lệ: {e}'}
+            continue
+        yield line_no, row if isinstance(row, dict) else {'_error': 'Mỗi dòng phải là một object'}
+
+
+class UserImporter:
+    def __init__(self, database, workers=None, batch_size=None, rounds=None, hash_profile=None, breached=None):
+        self.db = database
+        self.workers = workers or int(os.getenv('IMPORT_WORKERS', str(os.cpu_count() or 1)))
+        self.batch_size = batch_size or int(os.getenv('IMPORT_BATCH_SIZE', '500'))
+        # Cùng cost với HashingExecutor để lần đăng nhập đầu không phải băm lại
+        self.rounds = rounds or resolve_bcrypt_cost()
+        self.hash_profile = hash_profile or os.getenv('HASH_PROFILE', 'demo')
+        # Cùng kiểm tra mật khẩu bị lộ như đăng ký/đổi mật khẩu; None nếu chưa build filter
+        self.breached = breached if breached is not None else BreachedPasswords.open()
+
+    def _validate(self, row):
+        """Chuẩn hóa một dòng, trả về (user, lỗi)"""
+        if '_error' in row:
+            return None, row['_error']
+        for field in ('username', 'email', 'phone', 'password', 'password_hash'):
+            if row.get(field) is not None and not isinstance(row[field], str):
+                return None, f'{field} phải là chuỗi'
+        username = (row.get('username') or '').strip()
+        email = (row.get('email') or '').strip()
+        password = row.get('password') or ''
+        password_hash = (row.get('password_hash') or '').strip()
+        if not username or not email:
+            return None, 'Thiếu username hoặc email'
+        if not validate_email(email):
+            return None, 'Email không hợp lệ'
+        if password_hash:
+            if get_bcrypt_cost(password_hash) is None:
+                return None, 'password_hash không phải bcrypt'
+        else:
+            strength = validate_password_strength(password, self.breached)
+            if not strength['valid']:
+                return None, strength['message']
+        return {
+            'username': username,
+            'email': email,
+            'phone': (row.get('phone') or '').strip(),
+            'password': password,
+            'password_hash': password_hash,
+        }, None
+
+    def import_rows(self, rows, on_error=None):
+        """Import từ iterable (số dòng, dict), trả về báo cáo số dòng thành công/lỗi
+        on_error(số dòng, email, lỗi) được gọi cho từng dòng lỗi"""
+        report = {'imported': 0, 'failed': 0, 'errors': []}
+
+        def fail(line_no, email, error):
+            report['failed'] += 1
+            if on_error is not None:
+                on_error(line_no, email, error)
+            else:
+                report['errors'].append({'line': line_no, 'email': email, 'error': error})
+
+        start = time.perf_counter()
+        # Cùng context với HashingExecutor: không fork kèm kết nối SQLite, thread và lock đang giữ
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context()) as pool:
+            pending = None
+            batch = []
+            for line_no, row in rows:
+                try:
+                    user, error = self._validate(row)
+                except Exception as e:
+                    # Một dòng dữ liệu lạ không được làm dừng cả lần import
+                    user, error = None, f'Dòng không hợp lệ: {e}'
+                if error:
+                    fail(line_no, row.get('email'), error)
+                    continue
+                batch.append((line_no, user))
+                if len(batch) >= self.batch_size:
+                    # Băm lô mới trong khi insert lô trước
+                    submitted = self._submit(pool, batch, fail)
+                    if pending:
+                        report['imported'] += self._insert(pending, fail)
+                    pending, batch = submitted, []
+            if batch:
+                submitted = self._submit(pool, batch, fail)
+                if pending:
+                    report['imported'] += self._insert(pending, fail)
+                pending = submitted
+            if pending:
+                report['imported'] += self._insert(pending, fail)
+        report['elapsed'] = time.perf_counter() - start
+        return report
+
+    def _submit(self, pool, batch, fail):
+        """Bỏ các dòng đã trùng trong database rồi đưa phần còn lại vào process pool để băm"""
+        existing_emails, existing_usernames = self.db.find_existing_users(
+            [user['email'] for _, user in batch], [user['username'] for _, user in batch])
+        submitted = []
+        for line_no, user in batch:
+            if user['username'] in existing_usernames:
+                fail(line_no, user['email'], 'Tên đăng nhập đã tồn tại')
+            elif user['email'] in existing_emails:
+                fail(line_no, user['email'], 'Email đã được sử dụng')
+            elif user['password_hash']:
+                submitted.append((line_no, user, None))
+            else:
+                submitted.append((line_no, user, pool.submit(hash_password_bcrypt, user['password'], self.rounds)))
+        return submitted
+
+    def _insert(self, submitted, fail):
+        """Chờ băm xong và insert cả lô, trả về số user đã tạo"""
+        lines, users = [], []
+        for line_no, user, future in submitted:
+            try:
+                password_hash = future.result() if future is not None else user['password_hash']
+            except Exception as e:
+                fail(line_no, user['email'], f'Lỗi băm mật khẩu: {e}')
+                continue
+            password_md5 = password_sha256 = None
+            if self.hash_profile == 'demo' and user['password']:
+                password_md5 = hash_password_md5(user['password'])
+                password_sha256 = hash_password_sha256(user['password'])
+            lines.append((line_no, user['email']))
+            users.append((user['username'], user['email'], user['phone'],
+                          password_hash, password_md5, password_sha256))
+        if not users:
+            return 0
+
+        errors = self.db.create_users_bulk(users)
+        for (line_no, email), error in zip(lines, errors):
+            if error:
+                fail(line_no, email, error)
+        return errors.count(None)
+
+    def import_file(self, path, fmt=None, on_error=None):
+        """Import từ file CSV/JSONL ('-' là stdin)"""
+        fmt = detect_format(path, fmt)
+        if path == '-':
+            return self.import_rows(read_users(sys.stdin, fmt), on_error)
+        with open(path, newline='', encoding='utf-8') as f:
+            return self.import_rows(read_users(f, fmt), on_error)
+
+
+def export_users(database, file, fmt='jsonl', include_hash=False, batch_size=1000):
+    """Ghi toàn bộ user ra file dạng stream, trả về số user đã ghi"""
+    fields = EXPORT_FIELDS + (('password_hash',) if include_hash else ())
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+    count = 0
+    for user in database.iter_users(batch_size, include_hash):
+        if writer is not None:
+            writer.writerow(user)
+        else:
+            file.write(json.dumps(user, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import/export user hàng loạt')
+    parser.add_argument('--db', default='secure_auth.db')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    imp = sub.add_parser('import', help='Tạo user từ CSV/JSONL')
+    imp.add_argument('path', help="file nguồn ('-' = stdin)")
+    imp.add_argument('--format', choices=FORMATS)
+    imp.add_argument('--workers', type=int)
+    imp.add_argument('--batch-size', type=int)
+    imp.add_argument('--errors', help='ghi các dòng lỗi ra file JSONL')
+
+    exp = sub.add_parser('export', help='Xuất user ra CSV/JSONL')
+    exp.add_argument('path', help="file đích ('-' = stdout)")
+    exp.add_argument('--format', choices=FORMATS)
+    exp.add_argument('--include-hash', action='store_true', help='kèm password_hash để import sang hệ thống khác')
+    args = parser.parse_args()
+
+    from database import Database
+    db = Database(args.db)
+    db.init_db()
+
+    if args.command == 'import':
+        error_file = open(args.errors, 'w', encoding='utf-8') if args.errors else None
+
+        def on_error(line_no, email, error):
+            record = {'line': line_no, 'email': email, 'error': error}
+            if error_file:
+                error_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            else:
+                print(f"❌ Dòng {line_no} ({email}): {error}", file=sys.stderr)
+
+        importer = UserImporter(db, workers=args.workers, batch_size=args.batch_size)
+        try:
+            report = importer.import_file(args.path, args.format, on_error)
+        finally:
+            if error_file:
+                error_file.close()
+        print(f"✅ Đã tạo {report['imported']} user, {report['failed']} dòng lỗi "
+              f"trong {report['elapsed']:.1f}s (bcrypt cost {importer.rounds}, {importer.workers} workers)",
+              file=sys.stderr)
+    else:
+        fmt = detect_format(args.path, args.format)
+        if args.path == '-':
+            count = export_users(db, sys.stdout, fmt, args.include_hash)
+        else:
+            with open(args.path, 'w', newline='', encoding='utf-8') as f:
+                count = export_users(db, f, fmt, args.include_hash)
+        print(f"✅ Đã xuất {count} user", file=sys.stderr)
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
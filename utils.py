@@ -4,9 +4,10 @@ Các hàm tiện ích: băm mật khẩu, tạo OTP, validation
 """
 import hashlib
 import bcrypt
-import random
+import os
 import string
 import re
+import threading
 
 def hash_password_md5(password):
     """Băm mật khẩu với MD5 (không an toàn, chỉ để demo)"""
@@ -16,9 +17,16 @@ def hash_password_sha256(password):
     """Băm mật khẩu với SHA-256"""
     return hashlib.sha256(password.encode('utf-8')).hexdigest()
 
-def hash_password_bcrypt(password):
+def hash_password_bcrypt(password, rounds=12):
     """Băm mật khẩu với bcrypt (an toàn nhất)"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def get_bcrypt_cost(hashed_password):
+    """Lấy cost factor từ chuỗi hash bcrypt ($2b$12$...), None nếu không hợp lệ"""
+    try:
+        return int(hashed_password.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
 
 def verify_password(password, hashed_password):
     """Xác thực mật khẩu với bcrypt"""
@@ -27,30 +35,100 @@ def verify_password(password, hashed_password):
     except:
         return False
 
-def generate_otp(length=6):
-    """Tạo mã OTP ngẫu nhiên"""
-    return ''.join(random.choices(string.digits, k=length))
+# Độ dài và bảng ký tự của OTP (ký tự ASCII, không trùng nhau)
+OTP_LENGTH = int(os.getenv('OTP_LENGTH', '6'))
+OTP_ALPHABET = os.getenv('OTP_ALPHABET', string.digits)
+# Số byte lấy từ os.urandom mỗi lần nạp buffer
+OTP_BLOCK_SIZE = 4096
+
+_otp_tables = {}
+_otp_local = threading.local()
+
+def _reset_otp_buffers():
+    """Process con sau fork không được dùng lại buffer của process cha (sẽ ra OTP trùng)"""
+    global _otp_local
+    _otp_local = threading.local()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_otp_buffers)
+
+def _otp_table(alphabet):
+    """Bảng translate: byte < limit -> alphabet[byte % n], byte >= limit bị loại (rejection sampling)"""
+    table = _otp_tables.get(alphabet)
+    if table is None:
+        n = len(alphabet)
+        if not 2 <= n <= 256 or len(set(alphabet)) != n or not alphabet.isascii():
+            raise ValueError('OTP alphabet phải gồm 2-256 ký tự ASCII khác nhau')
+        # Bỏ phần dư để mọi ký tự có xác suất như nhau
+        limit = 256 - 256 % n
+        mapping = bytes(ord(alphabet[b % n]) if b < limit else 0 for b in range(256))
+        table = _otp_tables[alphabet] = (mapping, bytes(range(limit, 256)))
+    return table
+
+def generate_otp(length=None, alphabet=None):
+    """Tạo mã OTP bằng CSPRNG (os.urandom), lấy từ buffer riêng của mỗi thread"""
+    length = length or OTP_LENGTH
+    alphabet = alphabet or OTP_ALPHABET
+    buffers = getattr(_otp_local, 'buffers', None)
+    if buffers is None:
+        buffers = _otp_local.buffers = {}
+    buffer, pos = buffers.get(alphabet, ('', 0))
+    
+    if pos + length > len(buffer):
+        # Nạp lại cả khối: translate chạy trong C, không tốn vòng lặp Python cho từng ký tự
+        mapping, rejected = _otp_table(alphabet)
+        buffer = buffer[pos:]
+        while len(buffer) < length:
+            buffer += os.urandom(OTP_BLOCK_SIZE).translate(mapping, rejected).decode('ascii')
+        pos = 0
+    
+    buffers[alphabet] = (buffer, pos + length)
+    return buffer[pos:pos + length]
 
-def verify_otp_code(otp_code, length=6):
+def verify_otp_code(otp_code, length=None, alphabet=None):
     """Kiểm tra định dạng OTP"""
-    return len(otp_code) == length and otp_code.isdigit()
+    length = length or OTP_LENGTH
+    alphabet = alphabet or OTP_ALPHABET
+    return len(otp_code) == length and all(c in alphabet for c in otp_code)
+
+def otp_input_pattern(length=None, alphabet=None):
+    """Pattern HTML cho ô nhập OTP theo độ dài và bảng ký tự đang dùng"""
+    length = length or OTP_LENGTH
+    alphabet = alphabet or OTP_ALPHABET
+    if alphabet == string.digits:
+        return f'[0-9]{{{length}}}'
+    escaped = ''.join('\\' + c if c in '\\]^-[' else c for c in alphabet)
+    return f'[{escaped}]{{{length}}}'
 
 def validate_email(email):
     """Validate email format"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
 
-def validate_password_strength(password):
-    """Kiểm tra độ mạnh mật khẩu"""
+_PUNCTUATION = frozenset(string.punctuation)
+
+def validate_password_strength(password, breached=None):
+    """Kiểm tra độ mạnh mật khẩu (duyệt chuỗi một lần)
+    breached: tập mật khẩu bị lộ hỗ trợ `in` (vd. BreachedPasswords), None = bỏ qua"""
     if len(password) < 8:
         return {'valid': False, 'message': 'Mật khẩu phải có ít nhất 8 ký tự'}
     
-    has_upper = any(c.isupper() for c in password)
-    has_lower = any(c.islower() for c in password)
-    has_digit = any(c.isdigit() for c in password)
-    has_special = any(c in string.punctuation for c in password)
+    has_upper = has_lower = has_digit = has_special = False
+    for c in password:
+        if c.isupper():
+            has_upper = True
+        elif c.islower():
+            has_lower = True
+        elif c.isdigit():
+            has_digit = True
+        elif c in _PUNCTUATION:
+            has_special = True
+        else:
+            continue
+        if has_upper and has_lower and has_digit and has_special:
+            break
     
-    strength = sum([has_upper, has_lower, has_digit, has_special])
+    strength = has_upper + has_lower + has_digit + has_special
     
     if strength < 3:
         return {
@@ -58,6 +136,12 @@ def validate_password_strength(password):
             'message': 'Mật khẩu cần có chữ hoa, chữ thường, số và ký tự đặc biệt'
         }
     
+    if breached is not None and password in breached:
+        return {
+            'valid': False,
+            'message': 'Mật khẩu này đã bị lộ trong các vụ rò rỉ dữ liệu, vui lòng chọn mật khẩu khác'
+        }
+    
     return {'valid': True, 'message': 'Mật khẩu đủ mạnh'}
 
 def sanitize_input(text):